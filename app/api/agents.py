@@ -1,17 +1,21 @@
 from __future__ import annotations
 from typing import Dict, List
+import os
 import time
 
 # Use strict Plane-A for document QA
 try:
-    from .plane_a_query import query_plane_a
+    from .plane_a_query import query_plane_a_batch
 except Exception:
-    from app.api.plane_a_query import query_plane_a
+    from app.api.plane_a_query import query_plane_a_batch
 
 ANSWER_SCHEMA_KEYS = {"answer", "citations", "answer_confidence", "notes"}
 REVIEW_SCHEMA_KEYS = {"verification_conf", "defects", "fixed_answer"}
 RISK_SCHEMA_KEYS = {"category", "severity", "needs_human", "reason"}
 
+# Extra passages the retry reads beyond the ones pass 1 already scored
+RETRY_WIDEN = int(os.getenv("PLANE_A_RETRY_WIDEN", "0"))
+
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -30,8 +34,7 @@ def _citations_from_sources(sources: List[str]) -> List[Dict[str, str]]:
     return cits or [{"doc_id": "unknown", "section": "", "quote": ""}]
 
 
-def answer_pass_1(question: str) -> Dict:
-    res = query_plane_a(question, tau=1.5)
+def _answer_payload(res: Dict, notes_prefix: str) -> Dict:
     answer = res.get("answer", "").strip()
     conf = float(res.get("confidence_docqa", 0.0))
     citations = res.get("citations", [])
@@ -40,29 +43,31 @@ def answer_pass_1(question: str) -> Dict:
         "answer": answer,
         "citations": citations,  # Already in correct format from plane-a
         "answer_confidence": conf,
-        "notes": f"plane-a:{res.get('action', 'unknown')}",
+        "notes": f"{notes_prefix}:{res.get('action', 'unknown')}",
         "engine": res.get("engine", "plane-a"),
+        "doc_sha256": res.get("doc_sha256", {}),
         "debug_info": res.get("debug_info", {})
     }
     return payload
 
 
+def answer_pass_1(question: str) -> Dict:
+    return answer_pass_1_batch([question])[0]
+
+
+def answer_pass_1_batch(questions: List[str]) -> List[Dict]:
+    return [_answer_payload(res, "plane-a") for res in query_plane_a_batch(questions, tau=1.5)]
+
+
 def answer_pass_2(question: str) -> Dict:
-    # Second pass: lower tau for more aggressive extraction
-    res = query_plane_a(question, tau=1.0)  # More permissive than pass 1
-    answer = res.get("answer", "").strip()
-    conf = float(res.get("confidence_docqa", 0.0))
-    citations = res.get("citations", [])
-    
-    payload = {
-        "answer": answer,
-        "citations": citations,
-        "answer_confidence": conf,
-        "notes": f"plane-a-retry:{res.get('action', 'unknown')}",
-        "engine": res.get("engine", "plane-a"),
-        "debug_info": res.get("debug_info", {})
-    }
-    return payload
+    return answer_pass_2_batch([question])[0]
+
+
+def answer_pass_2_batch(questions: List[str]) -> List[Dict]:
+    # Second pass: lower tau for more aggressive extraction. Pass 1's scored
+    # passages are re-decided, so only widened passages hit the reader.
+    results = query_plane_a_batch(questions, tau=1.0, widen=RETRY_WIDEN)  # More permissive than pass 1
+    return [_answer_payload(res, "plane-a-retry") for res in results]
 
 
 def review_answer(answer_payload: Dict) -> Dict:
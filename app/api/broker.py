@@ -1,6 +1,46 @@
 import os
+from typing import Iterable, List, Sequence
+from uuid import uuid4
+
 import dramatiq
 from dramatiq.brokers.redis import RedisBroker
+from dramatiq.common import current_millis
 
 broker = RedisBroker(url=os.getenv("REDIS_URL", "redis://localhost:6379/0"))
-dramatiq.set_broker(broker)
\ No newline at end of file
+dramatiq.set_broker(broker)
+
+
+def enqueue_many(actor: dramatiq.Actor, args_list: Iterable[Sequence]) -> List[dramatiq.Message]:
+    """Send one message per args tuple, in a single Redis round trip.
+
+    RedisBroker.enqueue runs its dispatch script once per message; here the
+    same script calls are queued on one pipeline. This mirrors RedisBroker
+    internals (the dispatch script and its positional args), checked against
+    the dramatiq versions allowed by requirements.txt. Other brokers (e.g.
+    the stub broker), or a RedisBroker without the dispatch script, fall
+    back to enqueueing one message at a time.
+    """
+    messages = [actor.message(*args) for args in args_list]
+    target = actor.broker
+    dispatch = getattr(target, "scripts", {}).get("dispatch") if isinstance(target, RedisBroker) else None
+    if dispatch is None or not messages:
+        return [target.enqueue(m) for m in messages]
+
+    # Newer dramatiq versions pass the unpack limit before the command args
+    extra = [target._max_unpack_size()] if hasattr(target, "_max_unpack_size") else []
+    pipe = target.client.pipeline(transaction=False)
+    sent = []
+    for message in messages:
+        message = message.copy(options={"redis_message_id": str(uuid4())})
+        target.emit_before("enqueue", message, None)
+        args = [
+            "enqueue", current_millis(), message.queue_name, target.broker_id,
+            target.heartbeat_timeout, target.dead_message_ttl, 0, *extra,
+            message.options["redis_message_id"], message.encode(),
+        ]
+        dispatch(keys=[target.namespace], args=args, client=pipe)
+        sent.append(message)
+    pipe.execute()
+    for message in sent:
+        target.emit_after("enqueue", message, None)
+    return sent
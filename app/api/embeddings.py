@@ -0,0 +1,170 @@
+"""Shared BGE embedding service.
+
+One EmbeddingService owns the SentenceTransformer for the whole process, so
+index builds, query encoding and answer reuse never load the model twice.
+Vectors are cached by content. Corpus (policy chunk) vectors go to an
+on-disk SQLite table keyed by sha256(model, text), which survives restarts
+and is shared by every process on the host, so a rebuild never re-encodes
+unchanged chunks. Ad-hoc query vectors only go to a bounded in-memory LRU,
+so a repeated question or an answer_pass_2 retry is not re-encoded while
+the disk cache stays the size of the corpus.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .model_registry import registry
+
+EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./.embedding_cache.sqlite3")
+
+
+class EmbeddingService:
+    """Lazily loaded sentence embedder with LRU and disk vector caches."""
+
+    def __init__(self, model_name: str = EMBED_MODEL, cache_path: Optional[str] = CACHE_PATH,
+                 lru_size: int = 4096, device: str = "cpu") -> None:
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.lru_size = lru_size
+        self.device = device
+        # Loaded through the model registry so readiness reporting covers it
+        self.registry_name = f"embeddings:{model_name}"
+        registry.register(self.registry_name, self._load_model)
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"lru_hits": 0, "disk_hits": 0, "encoded": 0}
+
+    def _load_model(self):
+        from sentence_transformers import SentenceTransformer
+        # Explicitly CPU to avoid device initialization errors in workers
+        return SentenceTransformer(self.model_name, device=self.device)
+
+    @property
+    def model(self):
+        return registry.get(self.registry_name)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.cache_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread; WAL lets worker processes read while one writes
+            conn = sqlite3.connect(self.cache_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        conn = self._db()
+        if conn is None or not keys:
+            return {}
+        out: Dict[str, np.ndarray] = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vec FROM vectors WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            for key, blob in rows:
+                out[key] = np.frombuffer(blob, dtype=np.float32)
+        return out
+
+    def _disk_put(self, items: Dict[str, np.ndarray]) -> None:
+        conn = self._db()
+        if conn is None or not items:
+            return
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vec) VALUES (?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()],
+            )
+
+    def _lru_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lru_lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+            return vec
+
+    def _lru_put(self, key: str, vec: np.ndarray) -> None:
+        with self._lru_lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def encode(self, texts: List[str], remember: bool = True, persist: bool = False,
+               reencode: bool = False, show_progress_bar: bool = False,
+               counts: Optional[Dict[str, int]] = None) -> np.ndarray:
+        """Normalized float32 embeddings, one row per text.
+
+        remember=False skips the in-memory LRU (used for bulk document
+        encoding so index builds do not evict hot query vectors).
+        persist=True reads and writes the disk cache; it is meant for corpus
+        texts only, since queries would grow it without bound.
+        reencode=True ignores cached vectors and runs every text through the
+        model (cache entries are overwritten).
+        counts, if given, receives this call's lru_hits, disk_hits and encoded.
+        """
+        keys = [self._key(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        if remember and not reencode:
+            for k in keys:
+                vec = self._lru_get(k)
+                if vec is not None:
+                    found[k] = vec
+        lru_hits = len(found)
+        if persist and not reencode:
+            found.update(self._disk_get([k for k in dict.fromkeys(keys) if k not in found]))
+        disk_hits = len(found) - lru_hits
+
+        # Encode each distinct missing text once
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            vecs = self.model.encode(list(missing.values()), normalize_embeddings=True,
+                                     show_progress_bar=show_progress_bar)
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing, vecs)}
+            if persist:
+                self._disk_put(fresh)
+            found.update(fresh)
+        if remember:
+            for k in keys:
+                self._lru_put(k, found[k])
+
+        with self._lru_lock:
+            self._stats["lru_hits"] += lru_hits
+            self._stats["disk_hits"] += disk_hits
+            self._stats["encoded"] += len(missing)
+        if counts is not None:
+            counts.update(lru_hits=lru_hits, disk_hits=disk_hits, encoded=len(missing))
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[k] for k in keys])
+
+    def stats(self) -> Dict[str, object]:
+        with self._lru_lock:
+            out: Dict[str, object] = dict(self._stats)
+            out["lru_entries"] = len(self._lru)
+        out["model"] = self.model_name
+        out["model_loaded"] = registry.is_ready(self.registry_name)
+        return out
+
+
+# Cheap to construct: the model loads on first encode or registry warmup
+_service = EmbeddingService(lru_size=int(os.getenv("EMBED_QUERY_LRU", "4096")))
+
+
+def get_embedder() -> EmbeddingService:
+    """Process-wide embedding service"""
+    return _service
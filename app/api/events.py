@@ -1,11 +1,46 @@
 import os
 import json
+import threading
+import time
+from collections import OrderedDict
 import redis
 
 _pool = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
 
-def publish_event(run_id, question_id, stage, status, payload=None, metrics=None):
-    evt = {
+# Every event is appended to a per-run Redis Stream (replayed to SSE clients
+# that connect late or reconnect) and published on run:{id} for live tailing.
+# Live messages carry the stream id as "<id>\n<json>" so clients can resume.
+EVENT_LOG_MAXLEN = int(os.getenv("EVENT_LOG_MAXLEN", "5000"))
+EVENT_LOG_TTL = int(os.getenv("EVENT_LOG_TTL", str(7 * 24 * 3600)))
+# Worker-side buffering: events are coalesced per question and sent in one
+# pipeline at most every EVENT_FLUSH_MS, or when the buffer fills up
+EVENT_FLUSH_MS = int(os.getenv("EVENT_FLUSH_MS", "250"))
+EVENT_BUFFER_MAX = int(os.getenv("EVENT_BUFFER_MAX", "256"))
+# Seconds an export_run job may render before Dramatiq aborts it
+EXPORT_TIME_LIMIT = 30 * 60
+
+_APPEND_AND_PUBLISH = _pool.register_script("""
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'data', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('PUBLISH', KEYS[2], id .. '\\n' .. ARGV[3])
+return id
+""")
+
+
+def event_log_key(run_id) -> str:
+    return f"run:{run_id}:log"
+
+
+def progress_key(run_id) -> str:
+    return f"run:{run_id}:progress"
+
+
+def export_key(run_id) -> str:
+    return f"run:{run_id}:export"
+
+
+def _question_event(run_id, question_id, stage, status, payload=None, metrics=None):
+    return {
         "type": "question_update",
         "run_id": str(run_id),
         "question_id": str(question_id),
@@ -14,4 +49,146 @@ def publish_event(run_id, question_id, stage, status, payload=None, metrics=None
         "payload": payload or {},
         "metrics": metrics or {},
     }
-    _pool.publish(f"run:{run_id}", json.dumps(evt))
+
+
+def _append(client, run_id, evt):
+    _APPEND_AND_PUBLISH(
+        keys=[event_log_key(run_id), f"run:{run_id}"],
+        args=[EVENT_LOG_MAXLEN, EVENT_LOG_TTL, json.dumps(evt, separators=(",", ":"))],
+        client=client,
+    )
+
+
+def publish_event(run_id, question_id, stage, status, payload=None, metrics=None):
+    """Send one event immediately (one round trip)"""
+    _append(_pool, run_id, _question_event(run_id, question_id, stage, status, payload, metrics))
+
+
+def publish_run_event(run_id, event_type: str, **fields):
+    """Send a run-level (not per-question) event immediately"""
+    _append(_pool, run_id, {"type": event_type, "run_id": str(run_id), **fields})
+
+
+def set_export_status(run_id, reset: bool = False, **fields) -> None:
+    """Record the state of a run's PDF export job (polled by the API)"""
+    pipe = _pool.pipeline(transaction=False)
+    if reset:
+        pipe.delete(export_key(run_id))
+    pipe.hset(export_key(run_id), mapping={k: str(v) for k, v in fields.items()})
+    pipe.expire(export_key(run_id), EVENT_LOG_TTL)
+    pipe.execute()
+
+
+def get_export_status(run_id) -> dict:
+    return {k.decode(): v.decode() for k, v in _pool.hgetall(export_key(run_id)).items()}
+
+
+def claim_export(run_id, version: str, ttl: int = EXPORT_TIME_LIMIT + 300) -> bool:
+    """True for the first caller to request an export of this data version.
+
+    The claim outlives the export job's time limit, so a second job cannot
+    start while the first is still rendering.
+    """
+    return bool(_pool.set(f"{export_key(run_id)}:{version}", 1, nx=True, ex=ttl))
+
+
+def release_export(run_id, version: str) -> None:
+    _pool.delete(f"{export_key(run_id)}:{version}")
+
+
+def init_run_progress(run_id, total: int) -> None:
+    """Record a run's question count for the run_progress aggregate"""
+    pipe = _pool.pipeline(transaction=False)
+    pipe.hset(progress_key(run_id), mapping={"total": total, "answered": 0, "flagged": 0})
+    pipe.expire(progress_key(run_id), EVENT_LOG_TTL)
+    pipe.execute()
+
+
+class EventPublisher:
+    """Buffers question events and sends them to Redis in batches.
+
+    Events for the same question that are still buffered are coalesced into
+    one: the latest stage/status wins and payloads are merged as deltas, so
+    a question that moves from risk to final within one flush window costs a
+    single frame. Final events also bump the run's answered/flagged counters
+    and emit one run_progress event per run per flush.
+    """
+
+    def __init__(self, client=None, interval_ms: int = EVENT_FLUSH_MS,
+                 max_buffered: int = EVENT_BUFFER_MAX) -> None:
+        self.client = client or _pool
+        self.interval = interval_ms / 1000.0
+        self.max_buffered = max_buffered
+        self._buffer: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._last_flush = time.monotonic()
+
+    def emit(self, run_id, question_id, stage, status, payload=None, metrics=None) -> None:
+        key = (str(run_id), str(question_id))
+        evt = self._buffer.pop(key, None)
+        if evt is None:
+            # Copies, since later deltas are merged into them
+            evt = _question_event(run_id, question_id, stage, status, dict(payload or {}), dict(metrics or {}))
+        else:
+            evt["stage"], evt["status"] = stage, status
+            evt["payload"].update(payload or {})
+            evt["metrics"].update(metrics or {})
+        self._buffer[key] = evt
+        if len(self._buffer) >= self.max_buffered:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        """Flush if the interval has elapsed (call at stage boundaries)"""
+        if self._buffer and time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        events, self._buffer = list(self._buffer.values()), OrderedDict()
+        finals = {}
+        pipe = self.client.pipeline(transaction=False)
+        for evt in events:
+            _append(pipe, evt["run_id"], evt)
+            if evt["status"] == "final":
+                field = "answered" if evt["payload"].get("decision") == "answer" else "flagged"
+                counts = finals.setdefault(evt["run_id"], {"answered": 0, "flagged": 0})
+                counts[field] += 1
+        for run_id, counts in finals.items():
+            for field, n in counts.items():
+                if n:
+                    pipe.hincrby(progress_key(run_id), field, n)
+            pipe.hgetall(progress_key(run_id))
+        results = pipe.execute()
+        if not finals:
+            return
+
+        # Aggregates are built from the counters as of this flush
+        totals = [r for r in results if isinstance(r, dict)]
+        pipe = self.client.pipeline(transaction=False)
+        for run_id, raw in zip(finals, totals):
+            counts = {k.decode(): int(v) for k, v in raw.items()}
+            done = counts.get("answered", 0) + counts.get("flagged", 0)
+            total = counts.get("total", 0)
+            _append(pipe, run_id, {
+                "type": "run_progress",
+                "run_id": run_id,
+                "answered": counts.get("answered", 0),
+                "flagged": counts.get("flagged", 0),
+                "pending": max(total - done, 0),
+                "total": total,
+            })
+        pipe.execute()
+
+
+_local = threading.local()
+
+
+def get_publisher() -> EventPublisher:
+    """Per-thread publisher (dramatiq runs several worker threads per process)"""
+    pub = getattr(_local, "publisher", None)
+    if pub is None:
+        pub = _local.publisher = EventPublisher()
+    return pub
@@ -0,0 +1,161 @@
+"""Sparse BM25 index for lexical retrieval.
+
+The index is a term-major SciPy CSR matrix (one row of BM25-weighted
+postings per vocabulary term), so scoring a batch of questions is a
+single sparse product of their term-indicator rows with the postings.
+Only numpy and scipy are needed: no Chroma, torch or sentence-transformers.
+Both services.rag (policy lookup) and Plane-A (hybrid retrieval) use it,
+and chunk policies with the shared chunk_text so both index the same spans.
+"""
+import json
+import os
+import re
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from scipy import sparse
+from .vector_index import top_k
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SPACE_RE = re.compile(r"\s+")
+
+# Questions scored per sparse product, bounding the dense score block
+_QUERY_BLOCK = 256
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric runs ("AES-256" -> ["aes", "256"])"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, max_chars: int = 1400, overlap: int = 200) -> List[Tuple[int, int, str]]:
+    """Whitespace-normalized text split into overlapping (start, end, chunk)
+    windows; offsets index the normalized text"""
+    text = _SPACE_RE.sub(" ", text).strip()
+    n = len(text)
+    i = 0
+    out = []
+    while i < n:
+        j = min(n, i + max_chars)
+        chunk = text[i:j].strip()
+        if chunk:  # Skip empty chunks
+            out.append((i, j, chunk))
+        i = j - overlap if j < n else j
+    return out
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts (policy chunks)."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.idf = np.empty(0, dtype=np.float32)
+        # (n_terms, n_docs) BM25 term weights
+        self.postings = sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.postings.shape[1]
+
+    @classmethod
+    def build(cls, texts: Sequence[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        obj = cls(k1, b)
+        rows, cols, tfs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc] = len(tokens)
+            counts: Dict[int, int] = {}
+            for tok in tokens:
+                term = obj.vocab.setdefault(tok, len(obj.vocab))
+                counts[term] = counts.get(term, 0) + 1
+            rows.extend(counts)
+            cols.extend([doc] * len(counts))
+            tfs.extend(counts.values())
+        n_docs, n_terms = len(texts), len(obj.vocab)
+        tf = np.asarray(tfs, dtype=np.float32)
+        cols_arr = np.asarray(cols, dtype=np.int64)
+        df = np.bincount(np.asarray(rows, dtype=np.int64), minlength=n_terms).astype(np.float32)
+        # Lucene's non-negative idf
+        obj.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(lengths.mean()) if n_docs and lengths.mean() > 0 else 1.0
+        norm = k1 * (1.0 - b + b * lengths[cols_arr] / avgdl) if n_docs else np.empty(0, np.float32)
+        weights = obj.idf[np.asarray(rows, dtype=np.int64)] * tf * (k1 + 1.0) / (tf + norm)
+        obj.postings = sparse.csr_matrix(
+            (weights.astype(np.float32), (rows, cols)), shape=(n_terms, n_docs), dtype=np.float32
+        )
+        return obj
+
+    def _query_matrix(self, queries: Sequence[str]) -> sparse.csr_matrix:
+        indptr, indices = [0], []
+        for q in queries:
+            terms = sorted({self.vocab[t] for t in tokenize(q) if t in self.vocab})
+            indices.extend(terms)
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float32)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(queries), len(self.vocab)))
+
+    def score(self, queries: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw BM25 scores (n_queries, n_docs) and each query's upper bound.
+
+        The bound is sum(idf * (k1 + 1)) over the query's known terms, the
+        score of a document saturating every term; score / bound is a
+        confidence in [0, 1).
+        """
+        q = self._query_matrix(queries)
+        scores = np.asarray((q @ self.postings).todense(), dtype=np.float32)
+        bounds = np.asarray(q @ (self.idf * (self.k1 + 1.0)), dtype=np.float32).ravel()
+        return scores, bounds
+
+    def search(self, queries: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (confidences, indices), each (n_queries, k), best first.
+
+        Documents sharing no term with a query are never returned; such
+        slots hold index -1 and confidence 0.
+        """
+        k = min(k, len(self))
+        conf = np.zeros((len(queries), k), dtype=np.float32)
+        idx = np.full((len(queries), k), -1, dtype=np.int64)
+        if k <= 0:
+            return conf, idx
+        for start in range(0, len(queries), _QUERY_BLOCK):
+            scores, bounds = self.score(queries[start:start + _QUERY_BLOCK])
+            top_scores, top = top_k(scores, k)
+            hit = top_scores > 0
+            safe = np.where(bounds > 0, bounds, 1.0)[:, None]
+            rows = slice(start, start + len(bounds))
+            conf[rows] = np.where(hit, top_scores / safe, 0.0)
+            idx[rows] = np.where(hit, top, -1)
+        return conf, idx
+
+    def save(self, path: str) -> None:
+        """Write the postings as raw .npy arrays plus a vocabulary file"""
+        np.save(os.path.join(path, "bm25_data.npy"), self.postings.data)
+        np.save(os.path.join(path, "bm25_indices.npy"), self.postings.indices)
+        np.save(os.path.join(path, "bm25_indptr.npy"), self.postings.indptr)
+        np.save(os.path.join(path, "bm25_idf.npy"), self.idf)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(path, "bm25_vocab.json"), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "n_docs": len(self), "terms": terms}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "BM25Index":
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "bm25_vocab.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        obj = cls(meta["k1"], meta["b"])
+        obj.vocab = {t: i for i, t in enumerate(meta["terms"])}
+        obj.idf = np.load(os.path.join(path, "bm25_idf.npy"))
+        obj.postings = sparse.csr_matrix(
+            (
+                np.load(os.path.join(path, "bm25_data.npy"), mmap_mode=mode),
+                np.load(os.path.join(path, "bm25_indices.npy"), mmap_mode=mode),
+                np.load(os.path.join(path, "bm25_indptr.npy"), mmap_mode=mode),
+            ),
+            shape=(len(obj.vocab), meta["n_docs"]),
+        )
+        return obj
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "bm25_vocab.json"))
@@ -71,6 +71,28 @@ def health():
     return {"status": "ok"}
 
 
+# Models that must be loaded before /api/ready reports ready (comma-separated
+# registry names, e.g. "reader,embeddings:BAAI/bge-small-en-v1.5"). Empty for
+# replicas that only serve the non-inference API.
+REQUIRED_MODELS = [m.strip() for m in os.getenv("SAFEFORMS_REQUIRE_MODELS", "").split(",") if m.strip()]
+
+
+@app.get("/api/ready")
+def ready():
+    from fastapi.responses import JSONResponse
+    from .model_registry import registry
+    models = registry.status()
+    pending = [m for m in REQUIRED_MODELS if models.get(m, {}).get("state") != "ready"]
+    body = {"status": "ready" if not pending else "loading", "pending": pending, "models": models}
+    return JSONResponse(body, status_code=200 if not pending else 503)
+
+
+@app.get("/api/db/pool")
+def db_pool():
+    from .db import pool_stats
+    return pool_stats()
+
+
 # Routers (attempt lazy import; include only if present)
 route_specs = [
     ("app.api.routes.questionnaire", "/api/questionnaire", "questionnaire"),
@@ -100,6 +122,15 @@ try:
 except Exception:
     pass
 
+# Optional background model warmup (PLANE_A_WARMUP=1); loads run in a daemon
+# thread so the API answers /api/health and /api/ready immediately
+if os.getenv("PLANE_A_WARMUP") == "1":
+    try:
+        from .model_registry import registry
+        registry.warmup(background=True)
+    except Exception:
+        pass
+
 # Serve exported PDFs
 try:
     app.mount("/exports", StaticFiles(directory="exports"), name="exports")
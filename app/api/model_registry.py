@@ -0,0 +1,82 @@
+"""Registry of lazily loaded ML models.
+
+Modules register a loader under a name at import time; nothing heavy (torch,
+transformers, sentence-transformers) is imported until the first get() or an
+explicit warmup. The registry tracks per-model load state so the API can
+report readiness while models load in the background.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class ModelRegistry:
+    """Thread-safe, load-once holder for named models."""
+
+    def __init__(self) -> None:
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            self._state.setdefault(name, {"state": "not_loaded"})
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it on first use"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"unknown model: {name}")
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            self._state[name] = {"state": "loading", "started_at": time.time()}
+            t0 = time.time()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._state[name] = {"state": "error", "error": str(e)}
+                raise
+            self._models[name] = model
+            self._state[name] = {"state": "ready", "load_seconds": round(time.time() - t0, 3)}
+            return model
+
+    def is_ready(self, name: str) -> bool:
+        return name in self._models
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out = {name: dict(st) for name, st in self._state.items()}
+        now = time.time()
+        for st in out.values():
+            if st["state"] == "loading":
+                st["elapsed_seconds"] = round(now - st.pop("started_at"), 3)
+        return out
+
+    def warmup(self, names: Optional[Iterable[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+        """Load the given (default: all registered) models, optionally in a daemon thread"""
+        targets = list(names) if names is not None else list(self._loaders)
+
+        def _run() -> None:
+            for name in targets:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"[Models] Warmup of {name} failed: {e}")
+
+        if not background:
+            _run()
+            return None
+        thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+# Singleton for app
+registry = ModelRegistry()
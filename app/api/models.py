@@ -8,7 +8,7 @@ Internal note (refactor bootstrap):
 """
 
 import uuid
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, func, JSON
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Index, func, JSON
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
@@ -38,11 +38,15 @@ class Artifact(Base):
     stage = Column(String)   # answering|answering_retry|review|risk
     payload = Column(JSON)   # agent outputs
     latency_ms = Column(Integer)
+    created_at = Column(DateTime, server_default=func.now())
+
+    # Report/reuse lookups fetch a question's artifacts by stage
+    __table_args__ = (Index("ix_artifacts_question_id_stage", "question_id", "stage"),)
 
 class Approval(Base):
     __tablename__ = "approvals"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    question_id = Column(UUID(as_uuid=True), ForeignKey("questions.id"))
+    question_id = Column(UUID(as_uuid=True), ForeignKey("questions.id"), index=True)
     decision = Column(String)          # approve|needs_info
     reason = Column(Text, nullable=True)
     actor = Column(String)             # email/user id
@@ -1,37 +1,89 @@
+import hashlib
+import json
+import multiprocessing
 import os
-from typing import Dict
+import shutil
+import tempfile
+import uuid
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Optional
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from weasyprint import HTML
-from .db import SessionLocal
-from .models import Run, Question, Artifact, Approval
+from sqlalchemy import case, func, select
+from .db import session_scope
+from .models import Question, Artifact, Approval
 
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
 os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
+# Large runs are rendered PDF_CHUNK_SIZE questions at a time in up to
+# PDF_RENDER_WORKERS processes and then concatenated
+PDF_CHUNK_SIZE = int(os.getenv("PDF_CHUNK_SIZE", "100"))
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
 env = Environment(
     loader=FileSystemLoader(TEMPLATES_DIR),
     autoescape=select_autoescape(["html", "xml"]),
 )
 
+ANSWER_STAGES = ("answering", "answering_retry")
+
+
 def _collect(run_id: str) -> Dict:
-    db = SessionLocal()
-    run = db.query(Run).get(run_id)
-    qs = db.query(Question).filter(Question.run_id == run_id).all()
+    """Report data for a run in three set-based queries.
+
+    Questions, their answer Artifacts and their Approvals are each fetched
+    once for the whole run (joined on Question.run_id) instead of per
+    question; Artifact and Approval rows are streamed in chunks and grouped
+    by question in memory.
+    """
+    run_id = uuid.UUID(str(run_id))
+    with session_scope() as db:
+        qs = db.execute(
+            select(Question.id, Question.text, Question.final, Question.verify_conf, Question.risk_severity)
+            .where(Question.run_id == run_id)
+        ).all()
+
+        # Answer of each question's latest pipeline pass: the artifact the
+        # worker marked selected, else (older rows) pass 1 as before. Pass 1
+        # and its retry are written in one transaction and share created_at.
+        answers: Dict = {}
+        newest: Dict = {}
+        arts = db.execute(
+            select(Artifact.question_id, Artifact.created_at, Artifact.payload)
+            .join(Question, Question.id == Artifact.question_id)
+            .where(Question.run_id == run_id, Artifact.stage.in_(ANSWER_STAGES))
+            .order_by(Artifact.created_at.desc().nulls_last(), case((Artifact.stage == "answering", 0), else_=1))
+            .execution_options(yield_per=500)
+        )
+        for qid, created_at, payload in arts:
+            if qid not in newest:
+                newest[qid], answers[qid] = created_at, payload
+            elif created_at == newest[qid] and (payload or {}).get("selected"):
+                answers[qid] = payload
+
+        approvals: Dict = defaultdict(list)
+        rows = db.execute(
+            select(Approval.question_id, Approval.actor, Approval.decision, Approval.reason)
+            .join(Question, Question.id == Approval.question_id)
+            .where(Question.run_id == run_id)
+            .order_by(Approval.created_at)
+            .execution_options(yield_per=500)
+        )
+        for qid, actor, decision, reason in rows:
+            approvals[qid].append({"actor": actor, "decision": decision, "reason": reason})
+
     out = []
     answered = 0
     total = len(qs)
     docs = set()
     for q in qs:
-        arts = db.query(Artifact).filter(Artifact.question_id == q.id).all()
-        ans = next((a for a in arts if a.stage in ("answering_retry","answering")), None)
-        rev = next((a for a in arts if a.stage == "review"), None)
-        risk = next((a for a in arts if a.stage == "risk"), None)
-        cits = (ans.payload.get("citations") if ans else []) or []
+        payload = answers.get(q.id)
+        cits = (payload or {}).get("citations") or []
         for c in cits:
             if c.get("doc_id"): docs.add(c.get("doc_id"))
         if q.final == "answer":
             answered += 1
-        approvals = db.query(Approval).filter(Approval.question_id == q.id).all()
         out.append({
             "id": str(q.id),
             "text": q.text,
@@ -39,10 +91,7 @@ def _collect(run_id: str) -> Dict:
             "verify_conf": q.verify_conf,
             "risk": q.risk_severity,
             "citations": cits,
-            "approvals": [
-                {"actor": a.actor, "decision": a.decision, "reason": a.reason}
-                for a in approvals
-            ],
+            "approvals": approvals.get(q.id, []),
         })
     kpis = {
         "answered_pct": int((answered/total)*100) if total else 0,
@@ -52,12 +101,118 @@ def _collect(run_id: str) -> Dict:
     return {"kpis": kpis, "rows": out}
 
 
-def generate_pdf(run_id: str) -> str:
-    data = _collect(run_id)
+def _version_queries(run_id):
+    """Aggregates that change with every committed pipeline result or review.
+
+    Timestamps are not used: on Postgres now() is the transaction start, so
+    a late-committing transaction can land behind an existing max(). Row
+    counts cannot: every pipeline pass appends Artifacts, every review
+    appends an Approval, and question status/final counts track the rest.
+    """
+    run_id = uuid.UUID(str(run_id))
+    return (
+        select(Question.status, Question.final, func.count(Question.id))
+        .where(Question.run_id == run_id)
+        .group_by(Question.status, Question.final),
+        select(func.count(Artifact.id))
+        .join(Question, Question.id == Artifact.question_id)
+        .where(Question.run_id == run_id),
+        select(func.count(Approval.id))
+        .join(Question, Question.id == Approval.question_id)
+        .where(Question.run_id == run_id),
+    )
+
+
+def _version_key(*results) -> str:
+    st = os.stat(os.path.join(TEMPLATES_DIR, "report.html"))
+    rows = [sorted([str(v) for v in row] for row in result) for result in results]
+    blob = json.dumps([rows, st.st_mtime_ns, st.st_size])
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def data_version(run_id: str) -> str:
+    """Cache key for a run's report: changes whenever a question's results
+    are committed, an approval is added or the report template is edited."""
+    with session_scope() as db:
+        return _version_key(*(db.execute(stmt).all() for stmt in _version_queries(run_id)))
+
+
+async def data_version_async(db, run_id: str) -> str:
+    """data_version on an AsyncSession (for async request handlers)"""
+    return _version_key(*[(await db.execute(stmt)).all() for stmt in _version_queries(run_id)])
+
+
+def export_path(run_id: str, version: str) -> str:
+    return os.path.join(os.getenv("EXPORT_DIR", "exports"), f"run-{run_id}-{version}.pdf")
+
+
+def _render_part(html: str, path: str) -> str:
+    """Render one HTML section to a PDF file (runs in a worker process)"""
+    from weasyprint import HTML
+    HTML(string=html).write_pdf(path)
+    return path
+
+
+def _render_chunked(data: Dict, tmp_path: str, progress: Optional[Callable[..., None]] = None) -> None:
+    """Render the report in PDF_CHUNK_SIZE-question sections across worker
+    processes and concatenate them, keeping WeasyPrint's per-process layout
+    memory bounded by the section size."""
+    from pypdf import PdfWriter
+
     tpl = env.get_template("report.html")
-    html = tpl.render(**data)
-    out_dir = os.getenv("EXPORT_DIR", "exports")
-    os.makedirs(out_dir, exist_ok=True)
-    out_path = os.path.join(out_dir, f"run-{run_id}.pdf")
-    HTML(string=html).write_pdf(out_path)
+    rows = data["rows"]
+    chunks = [rows[i:i + PDF_CHUNK_SIZE] for i in range(0, len(rows), PDF_CHUNK_SIZE)]
+    part_dir = tempfile.mkdtemp(prefix="parts-", dir=os.path.dirname(tmp_path) or ".")
+    try:
+        paths = [os.path.join(part_dir, f"{i:05d}.pdf") for i in range(len(chunks))]
+        # spawn: worker threads make fork unsafe in the Dramatiq process
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(PDF_RENDER_WORKERS, len(chunks)), mp_context=ctx) as pool:
+            pending = set()
+            done = 0
+            for i, chunk in enumerate(chunks):
+                # Bound the HTML held in flight to a couple of sections per worker
+                while len(pending) >= 2 * PDF_RENDER_WORKERS:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in finished:
+                        f.result()
+                    done += len(finished)
+                    if progress: progress("rendering", parts_done=done, parts=len(chunks))
+                html = tpl.render(kpis=data["kpis"], rows=chunk, show_summary=(i == 0))
+                pending.add(pool.submit(_render_part, html, paths[i]))
+            for f in pending:
+                f.result()
+        if progress: progress("merging", parts_done=len(chunks), parts=len(chunks))
+        writer = PdfWriter()
+        for path in paths:
+            writer.append(path)
+        with open(tmp_path, "wb") as fh:
+            writer.write(fh)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+def generate_pdf(run_id: str, version: Optional[str] = None,
+                 progress: Optional[Callable[..., None]] = None) -> str:
+    """Render the run report to exports/run-{id}-{version}.pdf.
+
+    Output is content-addressed by data_version, so an existing file for the
+    current version is returned without rendering. Runs larger than
+    PDF_CHUNK_SIZE questions are rendered in parallel sections.
+    """
+    version = version or data_version(run_id)
+    out_path = export_path(run_id, version)
+    if os.path.exists(out_path):
+        return out_path
+    if progress: progress("collecting")
+    data = _collect(run_id)
+    if progress: progress("rendering")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    # Write then rename so readers never see a partial PDF
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    if len(data["rows"]) > PDF_CHUNK_SIZE:
+        _render_chunked(data, tmp_path, progress)
+    else:
+        _render_part(env.get_template("report.html").render(**data), tmp_path)
+    os.replace(tmp_path, out_path)
     return out_path
@@ -0,0 +1,118 @@
+"""Question-level result cache for Plane-A.
+
+Results are keyed on the normalized question text, tau, the index version
+and the model names, so a rebuilt index or a model swap never serves stale
+answers. Lookups go through an in-process LRU first and then, when
+PLANE_A_CACHE_REDIS_URL is set, a shared Redis tier used by all workers.
+Values are stored as JSON so every hit returns a fresh copy. The same tiers
+also hold each question's scored candidate passages, so a retry with another
+tau is decided without re-running retrieval or the reader.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+_PUNCT_TAIL = re.compile(r"[\s?.!:;]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    q = re.sub(r"\s+", " ", question).strip().lower()
+    return _PUNCT_TAIL.sub("", q)
+
+
+class AnswerCache:
+    """Two-tier (local LRU + optional Redis) cache of query_plane_a results."""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: int = 86400,
+                 redis_url: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            try:
+                import redis  # type: ignore
+                self._redis = redis.Redis.from_url(redis_url)
+            except Exception as e:
+                print(f"[Plane-A cache] Redis tier disabled: {e}")
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "shared_errors": 0}
+
+    @staticmethod
+    def key(question: str, tau: float, version: str, models: str) -> str:
+        raw = json.dumps([normalize_question(question), round(float(tau), 4), version, models])
+        return "plane_a:answer:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def candidates_key(question: str, version: str, models: str) -> str:
+        """Key of a question's scored passages, which do not depend on tau"""
+        raw = json.dumps([normalize_question(question), version, models])
+        return "plane_a:candidates:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            blob = self._lru.get(key)
+            if blob is not None:
+                self._lru.move_to_end(key)
+                self._stats["local_hits"] += 1
+                return json.loads(blob)
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(key)
+            except Exception:
+                raw = None
+                self._bump("shared_errors")
+            if raw is not None:
+                blob = raw.decode("utf-8")
+                self._store_local(key, blob)
+                self._bump("shared_hits")
+                return json.loads(blob)
+        self._bump("misses")
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        blob = json.dumps(value)
+        self._store_local(key, blob)
+        if self._redis is not None:
+            try:
+                self._redis.set(key, blob, ex=self.ttl_seconds)
+            except Exception:
+                self._bump("shared_errors")
+
+    def clear(self) -> None:
+        """Drop the local tier; shared entries expire by TTL or index version"""
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["local_entries"] = len(self._lru)
+        lookups = out["local_hits"] + out["shared_hits"] + out["misses"]
+        out["hit_rate"] = (out["local_hits"] + out["shared_hits"]) / lookups if lookups else 0.0
+        out["shared_tier"] = self._redis is not None
+        return out
+
+    def _store_local(self, key: str, blob: str) -> None:
+        with self._lock:
+            self._lru[key] = blob
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+
+# Singleton for app
+cache = AnswerCache(
+    max_entries=int(os.getenv("PLANE_A_CACHE_SIZE", "2048")),
+    ttl_seconds=int(os.getenv("PLANE_A_CACHE_TTL", "86400")),
+    redis_url=os.getenv("PLANE_A_CACHE_REDIS_URL"),
+)
@@ -1,13 +1,33 @@
+import hashlib
+import json
 import os
-import pickle
-import re
-from typing import Dict, List, Tuple
-from sklearn.neighbors import NearestNeighbors
-from sentence_transformers import SentenceTransformer
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .embeddings import EMBED_MODEL, get_embedder
+from . import vector_index
+from .lexical_index import BM25Index, chunk_text
+from .vector_index import make_index
 
 POLICY_DIR = "app/api/pseudo_dataset/policies"
-INDEX_PATH = "./sklearn_index.pkl"
-METADATA_PATH = "./sklearn_metadata.pkl"
+# Each build is written to its own version directory under INDEX_DIR; the
+# CURRENT file names the active one and is swapped atomically on publish
+INDEX_DIR = os.getenv("PLANE_A_INDEX_DIR", "./plane_a_index")
+CURRENT_PATH = os.path.join(INDEX_DIR, "CURRENT")
+FORMAT_VERSION = 2
+
+# Columnar per-chunk metadata; text lives in texts.bin at [text_start, text_end)
+_CHUNK_DTYPE = np.dtype([
+    ("doc", np.int32),
+    ("chunk_idx", np.int32),
+    ("start", np.int64),
+    ("end", np.int64),
+    ("text_start", np.int64),
+    ("text_end", np.int64),
+    ("hash", "S16"),  # blake2b of the chunk text, used to reuse vectors on rebuild
+])
 
 def _read_policies() -> Dict[str, str]:
     """Load all .md files from policy directory"""
@@ -20,88 +40,251 @@ def _read_policies() -> Dict[str, str]:
                 out[fname] = f.read()
     return out
 
-def _chunks(text: str, max_chars: int = 1400, overlap: int = 200) -> List[Tuple[int, int, str]]:
-    """Chunk text with overlap for better retrieval"""
-    text = re.sub(r"\s+", " ", text).strip()
-    n = len(text)
-    i = 0
-    out = []
-    while i < n:
-        j = min(n, i + max_chars)
-        chunk_text = text[i:j].strip()
-        if chunk_text:  # Skip empty chunks
-            out.append((i, j, chunk_text))
-        i = j - overlap if j < n else j
-    return out
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _chunk_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
 
 def build_index(reset: bool = False):
-    """Build sklearn NearestNeighbors index with BGE embeddings and proper chunking"""
-    if reset:
-        # Remove existing index files
-        for path in [INDEX_PATH, METADATA_PATH]:
-            if os.path.exists(path):
-                os.remove(path)
-    
-    # Check if index already exists
-    if not reset and os.path.exists(INDEX_PATH) and os.path.exists(METADATA_PATH):
-        print("Index already exists. Use reset=True to rebuild.")
-        return load_index()
+    """Build or incrementally update the Plane-A vector index.
 
-    # Load BGE model
-    bge = SentenceTransformer("BAAI/bge-small-en-v1.5")
-    
+    Every policy is re-chunked on each build; only vectors are reused.
+    With reset=False the current index is returned without writing when no
+    policy's content hash changed. Otherwise a chunk whose text hash is in
+    the current index keeps its vector, the rest are looked up in the
+    embedding disk cache, and only cache misses go through the model.
+    Deleted policies are dropped. With reset=True no vector is reused:
+    every chunk is encoded by the model and overwrites the disk cache
+    (e.g. after the model weights changed under the same name). In both
+    cases the old version stays active until the new one is published, so
+    concurrent readers keep working.
+    """
     policies = _read_policies()
-    texts, metadatas = [], []
-    
-    for doc_id, text in policies.items():
-        for idx, (s, e, chunk) in enumerate(_chunks(text)):
+    doc_ids = sorted(policies)
+    doc_hashes = {doc_id: _sha256(policies[doc_id]) for doc_id in doc_ids}
+
+    current = None
+    if not reset:
+        try:
+            current = get_index()
+        except Exception as e:
+            # Unreadable or old-format index: fall back to a full build
+            print(f"Existing index unusable ({e}); rebuilding from scratch")
+    if current is not None and current["manifest"].get("model") != EMBED_MODEL:
+        current = None
+    old_docs = current["manifest"].get("docs", {}) if current else {}
+    if current is not None and old_docs == {d: {"sha256": h} for d, h in doc_hashes.items()}:
+        print("Index is up to date.")
+        return current
+
+    # Vectors of the current index, addressable by chunk text hash
+    reusable: Dict[bytes, int] = {}
+    if current is not None:
+        for row, digest in enumerate(current["metadata"].hashes()):
+            reusable.setdefault(bytes(digest), row)
+
+    texts, rows, hashes = [], [], []
+    for doc, doc_id in enumerate(doc_ids):
+        for idx, (s, e, chunk) in enumerate(chunk_text(policies[doc_id])):
             texts.append(chunk)
-            metadatas.append({
-                "doc_id": doc_id, 
-                "chunk_idx": idx,
-                "start": s, 
-                "end": e,
-                "length": len(chunk),
-                "text": chunk  # Store text in metadata for retrieval
-            })
+            rows.append((doc, idx, s, e))
+            hashes.append(_chunk_hash(chunk))
 
     if not texts:
         print("No texts found to index")
         return None
 
-    # Generate embeddings
-    print(f"Generating embeddings for {len(texts)} chunks...")
-    embeddings = bge.encode(texts, normalize_embeddings=True, show_progress_bar=True)
-    
-    # Build sklearn NearestNeighbors index
-    index = NearestNeighbors(n_neighbors=10, metric='cosine', algorithm='brute')
-    index.fit(embeddings)
+    keep = [i for i, h in enumerate(hashes) if h in reusable]
+    todo = [i for i, h in enumerate(hashes) if h not in reusable]
+    parts = []
+    if keep:
+        parts.append((keep, current["index"].reconstruct(np.array([reusable[hashes[i]] for i in keep]))))
+    counts = {"disk_hits": 0, "encoded": 0}
+    if todo:
+        # Generate embeddings for new or edited chunks only
+        print(f"Generating embeddings for {len(todo)} of {len(texts)} chunks...")
+        # Vectors for chunk text seen in any earlier build come from the
+        # embedding cache, unless this is a reset
+        fresh = get_embedder().encode([texts[i] for i in todo], remember=False, persist=True,
+                                      reencode=reset, show_progress_bar=True, counts=counts)
+        parts.append((todo, fresh))
+    embeddings = np.empty((len(texts), parts[0][1].shape[1]), dtype=np.float32)
+    for positions, vecs in parts:
+        embeddings[positions] = vecs
     
-    # Save index and metadata
-    index_data = {
-        "index": index,
-        "embeddings": embeddings,
-        "metadata": metadatas
-    }
-    
-    with open(INDEX_PATH, "wb") as f:
-        pickle.dump(index_data, f)
+    # Embeddings are normalized, so the index is a dot-product search
+    index = make_index(embeddings)
     
-    with open(METADATA_PATH, "wb") as f:
-        pickle.dump(metadatas, f)
+    stats = {"embedded": counts["encoded"], "cached": counts["disk_hits"], "reused": len(keep)}
+    _publish(index, doc_ids, rows, texts, hashes, doc_hashes, stats=stats)
     
-    print(f"Indexed {len(texts)} chunks from {len(policies)} policies")
-    return index_data
+    print(f"Indexed {len(texts)} chunks from {len(policies)} policies ({stats['embedded']} embedded, "
+          f"{stats['cached']} from the embedding cache, {stats['reused']} reused)")
+    return get_index()
+
+def _publish(index, doc_ids: List[str], rows: List[Tuple[int, int, int, int]], texts: List[str],
+             hashes: List[bytes], doc_hashes: Dict[str, str], stats: Dict[str, int]) -> str:
+    """Write a complete version directory, then point CURRENT at it"""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    version = f"v-{time.time_ns()}-{os.getpid()}"
+    path = os.path.join(INDEX_DIR, version)
+    os.makedirs(path)
+
+    index.save(path)
+    BM25Index.build(texts).save(path)
+
+    blobs = [t.encode("utf-8") for t in texts]
+    ends = np.cumsum([len(b) for b in blobs], dtype=np.int64)
+    chunks = np.empty(len(rows), dtype=_CHUNK_DTYPE)
+    chunks["doc"], chunks["chunk_idx"], chunks["start"], chunks["end"] = zip(*rows)
+    chunks["text_start"] = ends - [len(b) for b in blobs]
+    chunks["text_end"] = ends
+    chunks["hash"] = hashes
+    np.save(os.path.join(path, "chunks.npy"), chunks)
+    with open(os.path.join(path, "texts.bin"), "wb") as f:
+        f.write(b"".join(blobs))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "model": EMBED_MODEL,
+        "index_kind": index.kind,
+        "count": len(rows),
+        "doc_ids": doc_ids,
+        "docs": {doc_id: {"sha256": doc_hashes[doc_id]} for doc_id in doc_ids},
+        "stats": stats,
+    }
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    tmp = f"{CURRENT_PATH}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, CURRENT_PATH)
+    _prune_versions(keep={version, *_previous_versions(version)})
+    return version
+
+def _previous_versions(current: str) -> List[str]:
+    names = sorted(n for n in os.listdir(INDEX_DIR) if n.startswith("v-") and n != current)
+    # Keep the last superseded version for processes that have not swapped yet
+    return names[-1:]
+
+def _prune_versions(keep) -> None:
+    for name in os.listdir(INDEX_DIR):
+        if name.startswith("v-") and name not in keep:
+            # Open memory maps stay valid after unlink on POSIX
+            shutil.rmtree(os.path.join(INDEX_DIR, name), ignore_errors=True)
+
+class ChunkStore:
+    """Read-only sequence of chunk metadata dicts backed by mmapped columns"""
+
+    def __init__(self, path: str, doc_ids: List[str]) -> None:
+        self._chunks = np.load(os.path.join(path, "chunks.npy"), mmap_mode="r")
+        text_path = os.path.join(path, "texts.bin")
+        size = os.path.getsize(text_path)
+        self._texts = np.memmap(text_path, dtype=np.uint8, mode="r") if size else np.empty(0, np.uint8)
+        self._doc_ids = doc_ids
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def hashes(self) -> np.ndarray:
+        return self._chunks["hash"]
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        row = self._chunks[i]
+        text = self._texts[row["text_start"]:row["text_end"]].tobytes().decode("utf-8")
+        return {
+            "doc_id": self._doc_ids[row["doc"]],
+            "chunk_idx": int(row["chunk_idx"]),
+            "start": int(row["start"]),
+            "end": int(row["end"]),
+            "length": len(text),
+            "text": text
+        }
+
+def _current_version() -> Optional[str]:
+    try:
+        with open(CURRENT_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def index_exists() -> bool:
+    version = _current_version()
+    return version is not None and os.path.exists(os.path.join(INDEX_DIR, version, "manifest.json"))
 
 def load_index():
-    """Load existing sklearn index and metadata"""
-    if not os.path.exists(INDEX_PATH):
+    """Open the current index version; arrays are memory-mapped, not copied"""
+    version = _current_version()
+    if version is None:
         return None
-    
-    with open(INDEX_PATH, "rb") as f:
-        index_data = pickle.load(f)
-    
-    return index_data
+    path = os.path.join(INDEX_DIR, version)
+    with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported index format {manifest.get('format_version')}; rebuild the index")
+
+    metadata = ChunkStore(path, manifest["doc_ids"])
+    if BM25Index.exists(path):
+        lexical = BM25Index.load(path)
+    else:
+        # Versions published before the lexical index existed
+        lexical = BM25Index.build([metadata[i]["text"] for i in range(len(metadata))])
+    return {
+        "index": vector_index.load_index(path, manifest["index_kind"]),
+        "metadata": metadata,
+        "lexical": lexical,
+        "manifest": manifest
+    }
+
+class _IndexHolder:
+    """Process-wide cache of the loaded index.
+
+    The CURRENT pointer is only re-read when its stat signature changes, so
+    a rebuild from any process is picked up by running workers on their
+    next query without a restart.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (signature, index_data) swapped as one tuple so readers never mix versions
+        self._state: Tuple[Optional[Tuple[int, int, int]], Optional[Dict[str, Any]]] = (None, None)
+
+    @staticmethod
+    def _signature() -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(CURRENT_PATH)
+        except FileNotFoundError:
+            return None
+        # os.replace gives CURRENT a new inode even within one mtime tick
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        sig = self._signature()
+        cached_sig, data = self._state
+        if sig is not None and sig == cached_sig:
+            return data
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            sig = self._signature()
+            cached_sig, data = self._state
+            if sig is None:
+                self._state = (None, None)
+            elif sig != cached_sig:
+                self._state = (sig, load_index())
+            return self._state[1]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._state = (None, None)
+
+_holder = _IndexHolder()
+
+def get_index() -> Optional[Dict[str, Any]]:
+    """Return the cached index, reloading it if the file on disk changed"""
+    return _holder.get()
 
 if __name__ == "__main__":
     # Build index on import or run directly
@@ -1,59 +1,97 @@
-from typing import Dict, Any, List
+import json
+import os
+from typing import Dict, Any, List, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from .plane_a_index import build_index, load_index
-from .plane_a_reader import decide_answer
+from .embeddings import get_embedder
+from .model_registry import registry
+from .plane_a_index import build_index, get_index
+from .plane_a_reader import decide_answers, decide_from_scores, score_passages, READER_CONFIG
+from .plane_a_cache import cache as answer_cache
 
-# Load BGE model once at startup, explicitly setting the device to CPU to fix initialization errors
-print("[Worker] Initializing BGE model...")
-BGE_MODEL = SentenceTransformer("BAAI/bge-small-en-v1.5", device='cpu')
-print("[Worker] BGE model initialized.")
+# Hybrid retrieval: BGE kNN and BM25 each propose HYBRID_DEPTH chunks, which
+# are merged by reciprocal-rank fusion. Fused chunks that are neither close
+# in embedding space nor a solid lexical match are dropped before the reader.
+HYBRID_DEPTH = int(os.getenv("PLANE_A_HYBRID_DEPTH", "20"))
+RRF_K = int(os.getenv("PLANE_A_RRF_K", "60"))
+MAX_DISTANCE = float(os.getenv("PLANE_A_MAX_DISTANCE", "0.5"))
+MIN_LEXICAL = float(os.getenv("PLANE_A_MIN_LEXICAL", "0.15"))
+# Passages read per question; a retry may widen this by `widen` more
+TOP_K = 6
+# Part of the answer cache key, so retuning retrieval invalidates cached answers
+RETRIEVAL = f"hybrid:{HYBRID_DEPTH}:{RRF_K}:{MAX_DISTANCE}:{MIN_LEXICAL}"
 
-def retrieve_passages(question: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    """Retrieve top-k most relevant passages using BGE embeddings + sklearn"""
-    # Load or build index
-    index_data = load_index()
+def _fuse(dense_idx: np.ndarray, lex_idx: np.ndarray, n: int) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion of two ranked id lists, best first"""
+    fused: Dict[int, float] = {}
+    for ranking in (dense_idx, lex_idx):
+        for rank, idx in enumerate(ranking):
+            # Both indexes pad short result rows with -1
+            if 0 <= idx < n:
+                fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+def retrieve_passages_batch(questions: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+    """Retrieve top-k passages for many questions: one encode call, one kNN
+    query and one batched BM25 query, fused by reciprocal rank"""
+    # Cached per process; reloaded only when the index file changes
+    index_data = get_index()
     if index_data is None:
         print("Index not found, building...")
         index_data = build_index(reset=False)
         if index_data is None:
-            return []
+            return [[] for _ in questions]
     
     index = index_data["index"]
     metadata = index_data["metadata"]
+    lexical = index_data.get("lexical")
+    depth = max(top_k, HYBRID_DEPTH)
     
-    # Encode query using the pre-loaded global model
-    query_embedding = BGE_MODEL.encode([question], normalize_embeddings=True)
+    # Encode all queries in one call through the shared, cached embedder
+    query_embeddings = get_embedder().encode(questions)
     
-    # Search sklearn index
-    distances, indices = index.kneighbors(query_embedding, n_neighbors=min(top_k, len(metadata)))
+    # Search the vector and lexical indexes for every query at once
+    distances, indices = index.search(query_embeddings, depth)
+    if lexical is not None and len(lexical):
+        lex_conf, lex_indices = lexical.search(questions, depth)
+    else:
+        lex_conf = np.zeros((len(questions), 0))
+        lex_indices = np.zeros((len(questions), 0), dtype=np.int64)
     
-    passages = []
-    for dist, idx in zip(distances[0], indices[0]):
-        if idx < len(metadata):
+    out = []
+    for q_emb, row_dists, row_idx, row_conf, row_lex in zip(
+            query_embeddings, distances, indices, lex_conf, lex_indices):
+        dense = {int(i): float(d) for i, d in zip(row_idx, row_dists) if 0 <= i < len(metadata)}
+        lex = {int(i): float(c) for i, c in zip(row_lex, row_conf) if 0 <= i < len(metadata)}
+        fused = _fuse(row_idx, row_lex, len(metadata))[:top_k]
+        # Lexical-only hits still get a real cosine distance
+        missing = [i for i, _ in fused if i not in dense]
+        if missing:
+            sims = index.reconstruct(np.asarray(missing)) @ np.asarray(q_emb, dtype=np.float32)
+            dense.update(zip(missing, (1.0 - sims).tolist()))
+        
+        passages = []
+        for rank, (idx, rrf) in enumerate(fused):
+            # The best fused chunk always reaches the reader
+            if rank and dense[idx] > MAX_DISTANCE and lex.get(idx, 0.0) < MIN_LEXICAL:
+                continue
             meta = metadata[idx]
             passages.append({
                 "text": meta["text"], 
                 "metadata": meta, 
-                "distance": float(dist)  # Cosine distance
+                "row": idx,
+                "distance": dense[idx],  # Cosine distance
+                "lexical": lex.get(idx, 0.0),  # BM25 confidence (0 outside the lexical top-depth)
+                "rrf": rrf
             })
+        out.append(passages)
     
-    return passages
+    return out
 
-def query_plane_a(question: str, tau: float = 1.5) -> Dict[str, Any]:
-    """
-    Strict Plane-A: BGE retrieval + RoBERTa SQuAD2 extraction + abstain logic
-    
-    Args:
-        question: User question (no history, no context)
-        tau: Abstain threshold (higher = more conservative)
-    
-    Returns:
-        Clean JSON with action (answer|flag), extracted span, confidence, citations
-    """
-    # Retrieve relevant passages
-    passages = retrieve_passages(question, top_k=6)
-    
+def retrieve_passages(question: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """Retrieve top-k most relevant passages using BGE embeddings + BM25 fusion"""
+    return retrieve_passages_batch([question], top_k=top_k)[0]
+
+def _result(question: str, passages: List[Dict[str, Any]], verdict: Dict[str, Any]) -> Dict[str, Any]:
     if not passages:
         return {
             "question": question,
@@ -66,14 +104,13 @@ def query_plane_a(question: str, tau: float = 1.5) -> Dict[str, Any]:
             "debug_info": {"reason": "no_passages_found"}
         }
     
-    # Run extractive QA with abstain logic
-    verdict = decide_answer(question, passages, tau=tau)
-    
     # Add retrieval debug info
     retrieval = [{
         "doc_id": p["metadata"]["doc_id"],
         "chunk_idx": p["metadata"]["chunk_idx"],
         "distance": p["distance"],
+        "lexical": p.get("lexical", 0.0),
+        "rrf": p.get("rrf", 0.0),
         "length": p["metadata"].get("length", 0)
     } for p in passages]
     
@@ -88,6 +125,131 @@ def query_plane_a(question: str, tau: float = 1.5) -> Dict[str, Any]:
         "debug_info": verdict.get("debug_info", {})
     }
 
+def query_plane_a(question: str, tau: float = 1.5) -> Dict[str, Any]:
+    """
+    Strict Plane-A: BGE retrieval + RoBERTa SQuAD2 extraction + abstain logic
+    
+    Args:
+        question: User question (no history, no context)
+        tau: Abstain threshold (higher = more conservative)
+    
+    Returns:
+        Clean JSON with action (answer|flag), extracted span, confidence, citations
+    """
+    return query_plane_a_batch([question], tau=tau)[0]
+
+def query_plane_a_batch(questions: List[str], tau: float = 1.5, widen: int = 0) -> List[Dict[str, Any]]:
+    """
+    Batched query_plane_a: one BGE encode, one kNN query and fixed-size
+    reader batches for all questions. Results are in input order.
+
+    Results are served from the answer cache when the same normalized
+    question was already answered with this tau against this index version.
+    Otherwise the question's scored passages from an earlier call (e.g. pass
+    1) are re-decided with this tau; only passages never read before, such
+    as the `widen` extra ones, go through the reader.
+    """
+    if not questions:
+        return []
+    
+    index_data = get_index()
+    if index_data is None:
+        # No index version to key on yet; retrieval builds the index
+        return _run_batch(questions, tau)
+    
+    models = f"{index_data['manifest']['model']}|{READER_CONFIG}|{RETRIEVAL}"
+    version = index_data["manifest"]["version"]
+    answer_models = f"{models}|widen:{widen}" if widen else models
+    keys = [answer_cache.key(q, tau, version, answer_models) for q in questions]
+    results: List[Any] = [answer_cache.get(k) for k in keys]
+    
+    # Compute each distinct missing key once, even if repeated in the batch
+    todo: Dict[str, str] = {}
+    for q, k, r in zip(questions, keys, results):
+        if r is None:
+            todo.setdefault(k, q)
+    if todo:
+        computed, complete = _run_cached(list(todo.values()), tau, widen, index_data, models)
+        fresh = dict(zip(todo, computed))
+        for k, ok in zip(todo, complete):
+            # A flag caused by a failed reader batch is not an answer; recompute next time
+            if ok:
+                answer_cache.set(k, fresh[k])
+        results = [r if r is not None else json.loads(json.dumps(fresh[k])) for k, r in zip(keys, results)]
+    
+    # Content hashes of the cited policies, so a stored answer can later be
+    # checked against the documents it quotes (see plane_a_reuse)
+    docs = index_data["manifest"].get("docs", {})
+    for q, r in zip(questions, results):
+        r["question"] = q
+        r["doc_sha256"] = {c["doc_id"]: docs[c["doc_id"]]["sha256"]
+                           for c in r.get("citations", []) if c.get("doc_id") in docs}
+    return results
+
+def _run_batch(questions: List[str], tau: float) -> List[Dict[str, Any]]:
+    passages_list = retrieve_passages_batch(questions, top_k=TOP_K)
+    verdicts = decide_answers(questions, passages_list, tau=tau)
+    return [_result(q, p, v) for q, p, v in zip(questions, passages_list, verdicts)]
+
+def _run_cached(questions: List[str], tau: float, widen: int, index_data: Dict[str, Any],
+                models: str) -> Tuple[List[Dict[str, Any]], List[bool]]:
+    """_run_batch that keeps each question's scored passages in the cache
+    and reuses them, so the reader never scores the same passage twice.
+    A widened set is stored under its own key (it starts from the pass-1
+    set), so pass-1 decisions never see passages only a retry retrieved.
+
+    Also returns, per question, whether every passage was scored (False
+    when a reader batch failed), i.e. whether the result may be cached.
+    """
+    metadata = index_data["metadata"]
+    version = index_data["manifest"]["version"]
+    ckeys = [answer_cache.candidates_key(q, version, models) for q in questions]
+    if widen:
+        wkeys = [answer_cache.candidates_key(q, version, f"{models}|widen:{widen}") for q in questions]
+        done = [answer_cache.get(k) for k in wkeys]
+        stored = [cand if cand is not None else answer_cache.get(k) for cand, k in zip(done, ckeys)]
+        ckeys = wkeys
+    else:
+        stored = done = [answer_cache.get(k) for k in ckeys]
+    
+    # Scored passages as [{row, distance, lexical, rrf}] plus reader scores
+    passages_list: List[List[Dict[str, Any]]] = []
+    scores_list: List[List[Any]] = []
+    for cand in stored:
+        passages, scores = [], []
+        for fields, score in zip((cand or {}).get("passages", []), (cand or {}).get("scores", [])):
+            meta = metadata[fields["row"]]
+            passages.append({"text": meta["text"], "metadata": meta, **fields})
+            scores.append(score)
+        passages_list.append(passages)
+        scores_list.append(scores)
+    
+    # Retrieve for questions without a stored set of this width
+    need = [i for i, cand in enumerate(done) if cand is None]
+    new_passages: List[List[Dict[str, Any]]] = []
+    if need:
+        retrieved = retrieve_passages_batch([questions[i] for i in need], top_k=TOP_K + widen)
+        for i, fetched in zip(need, retrieved):
+            seen = {p["row"] for p in passages_list[i]}
+            new_passages.append([p for p in fetched if p["row"] not in seen])
+        new_scores = score_passages([questions[i] for i in need], new_passages)
+        for i, passages, scores in zip(need, new_passages, new_scores):
+            passages_list[i].extend(passages)
+            scores_list[i].extend(scores)
+            # Failed reader batches are not kept, so they are retried next time
+            if all(score is not None for score in scores_list[i]):
+                answer_cache.set(ckeys[i], {
+                    "passages": [{k: p[k] for k in ("row", "distance", "lexical", "rrf")} for p in passages_list[i]],
+                    "scores": scores_list[i],
+                })
+    
+    verdicts = decide_from_scores(passages_list, scores_list, tau=tau)
+    for cand, verdict in zip(stored, verdicts):
+        if cand is not None:
+            verdict.setdefault("debug_info", {})["reused_scores"] = True
+    complete = [all(score is not None for score in scores) for scores in scores_list]
+    return [_result(q, p, v) for q, p, v in zip(questions, passages_list, verdicts)], complete
+
 def health_check(deep: bool = False) -> Dict[str, Any]:
     """Check Plane-A readiness.
 
@@ -95,11 +257,10 @@ def health_check(deep: bool = False) -> Dict[str, Any]:
     When deep=True: also load QA model to verify heavy dependencies.
     """
     try:
-        import os
-        from .plane_a_index import INDEX_PATH
+        from .plane_a_index import index_exists
         
-        # Fast check: just verify index file exists
-        if not os.path.exists(INDEX_PATH):
+        # Fast check: just verify an index version is published
+        if not index_exists():
             return {
                 "status": "not_ready",
                 "error": "Index not found",
@@ -114,7 +275,7 @@ def health_check(deep: bool = False) -> Dict[str, Any]:
             }
 
         # Deep check: actually load index and models
-        index_data = load_index()
+        index_data = get_index()
         if index_data is None:
             return {
                 "status": "error",
@@ -140,11 +301,10 @@ def health_check(deep: bool = False) -> Dict[str, Any]:
             "suggestion": "Check dependencies or rebuild index"
         }
 
-def warmup_models() -> Dict[str, Any]:
-    """Load heavy QA model into memory to reduce first-request latency."""
+def warmup_models(background: bool = False) -> Dict[str, Any]:
+    """Load the reader and embedding models to reduce first-request latency."""
     try:
-        from .plane_a_reader import _load_model
-        _load_model()
-        return {"status": "warmed"}
+        registry.warmup(background=background)
+        return {"status": "warming" if background else "warmed", "models": registry.status()}
     except Exception as e:
         return {"status": "error", "error": str(e)}
@@ -1,112 +1,134 @@
-from typing import List, Dict, Any
-import torch
-from transformers import AutoTokenizer, AutoModelForQuestionAnswering
+import os
+from typing import List, Dict, Any, Optional
+
+from .model_registry import registry
 
 _MODEL = "deepset/roberta-base-squad2"
+# Max (question, passage) pairs per forward pass when batching across questions
+BATCH_SIZE = int(os.getenv("PLANE_A_READER_BATCH", "32"))
+# Long passages are read in windows of the model's full 512 tokens, so most
+# chunks need one window. Windows overlap by DOC_STRIDE tokens, so any span
+# up to that length lies whole inside some window.
+MAX_LENGTH = 512
+DOC_STRIDE = int(os.getenv("PLANE_A_DOC_STRIDE", "64"))
+MAX_QUESTION_TOKENS = 128
+# Identifies reader output for caches (answers change with the windowing)
+READER_CONFIG = f"{_MODEL}:{MAX_LENGTH}/{DOC_STRIDE}"
 _tokenizer = None
 _model = None
 
+def _load_reader():
+    # torch/transformers are imported here so importing this module stays cheap
+    from transformers import AutoTokenizer, AutoModelForQuestionAnswering
+    tokenizer = AutoTokenizer.from_pretrained(_MODEL)
+    model = AutoModelForQuestionAnswering.from_pretrained(_MODEL)
+    model.eval()
+    return tokenizer, model
+
+registry.register("reader", _load_reader)
+
 def _load_model():
     """Lazy load model to avoid startup overhead"""
     global _tokenizer, _model
     if _tokenizer is None:
-        _tokenizer = AutoTokenizer.from_pretrained(_MODEL)
-        _model = AutoModelForQuestionAnswering.from_pretrained(_MODEL)
-        _model.eval()
+        _tokenizer, _model = registry.get("reader")
+
+def _qa_on_pairs(questions: List[str], contexts: List[str]) -> List[Dict[str, Any]]:
+    """Run QA on (question, context) pairs, return per-pair scores and best span.
 
-@torch.inference_mode()
-def _qa_on_context(question: str, context: str) -> Dict[str, Any]:
-    """Run QA on single context, return scores and span indices"""
+    Contexts longer than one window are split into MAX_LENGTH-token windows
+    overlapping by DOC_STRIDE tokens; the windows of every pair share one
+    padded forward pass. Each window is scored exactly as a single
+    truncated pair was (only padding is masked), so a pair that fits one
+    window gets the same s_best, s_null and span as before. Across windows
+    the span comes from the one with the highest s_best and s_null is the
+    lowest.
+    """
+    import torch
     _load_model()
     
-    inputs = _tokenizer.encode_plus(
-        question, context, 
+    # Over-long questions would leave no room for context in any window
+    q_ids = _tokenizer(questions, add_special_tokens=False)["input_ids"]
+    questions = [q if len(ids) <= MAX_QUESTION_TOKENS else _tokenizer.decode(ids[:MAX_QUESTION_TOKENS])
+                 for q, ids in zip(questions, q_ids)]
+    
+    inputs = _tokenizer(
+        questions, contexts,
         return_tensors="pt", 
-        truncation=True, 
-        max_length=512,
-        return_offsets_mapping=True
+        padding=True,
+        truncation="only_second", 
+        max_length=MAX_LENGTH,
+        stride=DOC_STRIDE,
+        return_overflowing_tokens=True
     )
+    pair_of_window = inputs.pop("overflow_to_sample_mapping").tolist()
     
-    outputs = _model(**{k: v for k, v in inputs.items() if k != 'offset_mapping'})
-    start_logits = outputs.start_logits[0]
-    end_logits = outputs.end_logits[0]
+    with torch.inference_mode():
+        outputs = _model(**inputs)
+    # Padding positions must never win the argmax
+    pad = inputs["attention_mask"] == 0
+    start_logits = outputs.start_logits.masked_fill(pad, float("-inf"))
+    end_logits = outputs.end_logits.masked_fill(pad, float("-inf"))
     
-    # Best non-null span
-    start_idx = int(torch.argmax(start_logits))
-    end_idx = int(torch.argmax(end_logits))
+    # Best non-null span per window
+    start_idx = torch.argmax(start_logits, dim=1)
+    end_idx = torch.maximum(torch.argmax(end_logits, dim=1), start_idx)  # Ensure end >= start
+    rows = torch.arange(len(pair_of_window))
     
-    # Ensure end >= start
-    if end_idx < start_idx:
-        end_idx = start_idx
-    
-    s_best = float(start_logits[start_idx] + end_logits[end_idx])
+    s_best = (start_logits[rows, start_idx] + end_logits[rows, end_idx]).tolist()
     # Null score (CLS token at position 0)
-    s_null = float(start_logits[0] + end_logits[0])
+    s_null = (start_logits[:, 0] + end_logits[:, 0]).tolist()
     
-    return {
-        "start_idx": start_idx, 
-        "end_idx": end_idx,
-        "s_best": s_best, 
-        "s_null": s_null,
-        "inputs": inputs
-    }
+    results: List[Optional[Dict[str, Any]]] = [None] * len(contexts)
+    for w, i in enumerate(pair_of_window):
+        res = results[i]
+        if res is None:
+            res = results[i] = {"s_best": float("-inf"), "s_null": s_null[w], "span": "", "windows": 0}
+        res["windows"] += 1
+        res["s_null"] = min(res["s_null"], s_null[w])
+        if s_best[w] > res["s_best"]:
+            span = _decode_span(inputs["input_ids"][w], int(start_idx[w]), int(end_idx[w]))
+            res["s_best"], res["span"] = s_best[w], span
+    return results
 
-def _decode_span(inputs, s_idx: int, e_idx: int) -> str:
+def _decode_span(input_ids, s_idx: int, e_idx: int) -> str:
     """Decode token span back to text"""
     if e_idx < s_idx:
         return ""
-    tokens = inputs["input_ids"][0][s_idx:e_idx+1]
+    tokens = input_ids[s_idx:e_idx+1]
     return _tokenizer.decode(tokens, skip_special_tokens=True).strip()
 
-def decide_answer(question: str, passages: List[Dict[str, Any]], tau: float = 1.5) -> Dict[str, Any]:
-    """
-    Strict extractive QA with abstain logic
-    
-    Args:
-        question: User question
-        passages: List of {text, metadata, distance} from retrieval
-        tau: Abstain threshold (higher = more conservative)
-    
-    Returns:
-        {action, answer, confidence_docqa, citations, debug_info}
-    """
-    if not passages:
-        return {
-            "action": "flag", 
-            "answer": "", 
-            "confidence_docqa": 0.0, 
-            "citations": [],
-            "debug_info": {"reason": "no_passages"}
-        }
-    
+def _no_passages() -> Dict[str, Any]:
+    return {
+        "action": "flag", 
+        "answer": "", 
+        "confidence_docqa": 0.0, 
+        "citations": [],
+        "debug_info": {"reason": "no_passages"}
+    }
+
+def _verdict(passages: List[Dict[str, Any]], results: List[Dict[str, Any]], tau: float) -> Dict[str, Any]:
+    """Pick the strongest span across a question's passages and apply the abstain rule"""
     best = None
     candidates = []
     
-    for p in passages:
-        try:
-            res = _qa_on_context(question, p["text"])
-            delta = res["s_null"] - res["s_best"]
-            span = _decode_span(res["inputs"], res["start_idx"], res["end_idx"])
-            
-            cand = {
-                "delta": delta, 
-                "span": span,
-                "s_best": res["s_best"], 
-                "s_null": res["s_null"],
-                "meta": p["metadata"], 
-                "ctx": p["text"],
-                "retrieval_distance": p["distance"]
-            }
-            candidates.append(cand)
-            
-            # Keep the smallest delta (strongest evidence)
-            if best is None or cand["delta"] < best["delta"]:
-                best = cand
-                
-        except Exception as e:
-            # Log but continue with other passages
-            print(f"QA error on passage: {e}")
-            continue
+    for p, res in zip(passages, results):
+        delta = res["s_null"] - res["s_best"]
+        
+        cand = {
+            "delta": delta, 
+            "span": res["span"],
+            "s_best": res["s_best"], 
+            "s_null": res["s_null"],
+            "meta": p["metadata"], 
+            "ctx": p["text"],
+            "retrieval_distance": p["distance"]
+        }
+        candidates.append(cand)
+        
+        # Keep the smallest delta (strongest evidence)
+        if best is None or cand["delta"] < best["delta"]:
+            best = cand
 
     if best is None or not best["span"]:
         return {
@@ -155,3 +177,74 @@ def decide_answer(question: str, passages: List[Dict[str, Any]], tau: float = 1.
             "candidates_evaluated": len(candidates)
         }
     }
+
+def decide_answer(question: str, passages: List[Dict[str, Any]], tau: float = 1.5) -> Dict[str, Any]:
+    """
+    Strict extractive QA with abstain logic
+    
+    Args:
+        question: User question
+        passages: List of {text, metadata, distance} from retrieval
+        tau: Abstain threshold (higher = more conservative)
+    
+    Returns:
+        {action, answer, confidence_docqa, citations, debug_info}
+    """
+    return decide_answers([question], [passages], tau=tau)[0]
+
+def _score_pairs(questions: List[str], contexts: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """Reader scores {s_best, s_null, span} per (question, context) pair, in
+    fixed-size batches of BATCH_SIZE; None where a batch failed"""
+    scores: List[Optional[Dict[str, Any]]] = []
+    for i in range(0, len(contexts), BATCH_SIZE):
+        qs, ctxs = questions[i:i+BATCH_SIZE], contexts[i:i+BATCH_SIZE]
+        try:
+            scores.extend(_qa_on_pairs(qs, ctxs))
+        except Exception as e:
+            # Keep alignment; affected questions end up with no valid spans
+            print(f"QA error on batch: {e}")
+            scores.extend([None] * len(ctxs))
+    return scores
+
+def score_passages(questions: List[str], passages_list: List[List[Dict[str, Any]]]) -> List[List[Optional[Dict[str, Any]]]]:
+    """
+    Run the reader over every question x passage pair and regroup per question.
+
+    The scores do not depend on tau, so they can be kept and re-decided
+    with decide_from_scores (e.g. by the lower-tau retry pass).
+    """
+    questions_flat: List[str] = []
+    contexts_flat: List[str] = []
+    for question, passages in zip(questions, passages_list):
+        for p in passages:
+            questions_flat.append(question)
+            contexts_flat.append(p["text"])
+    
+    scores_flat = _score_pairs(questions_flat, contexts_flat)
+    out = []
+    offset = 0
+    for passages in passages_list:
+        out.append(scores_flat[offset:offset+len(passages)])
+        offset += len(passages)
+    return out
+
+def decide_from_scores(passages_list: List[List[Dict[str, Any]]], scores_list: List[List[Optional[Dict[str, Any]]]],
+                       tau: float = 1.5) -> List[Dict[str, Any]]:
+    """Apply the abstain rule with threshold tau to already scored passages"""
+    verdicts = []
+    for passages, scores in zip(passages_list, scores_list):
+        if not passages:
+            verdicts.append(_no_passages())
+            continue
+        pairs = [(p, r) for p, r in zip(passages, scores) if r is not None]
+        verdicts.append(_verdict([p for p, _ in pairs], [r for _, r in pairs], tau))
+    return verdicts
+
+def decide_answers(questions: List[str], passages_list: List[List[Dict[str, Any]]], tau: float = 1.5) -> List[Dict[str, Any]]:
+    """
+    Batched decide_answer for many questions.
+
+    All question x passage pairs are flattened and pushed through the reader
+    in fixed-size batches of BATCH_SIZE, then regrouped per question.
+    """
+    return decide_from_scores(passages_list, score_passages(questions, passages_list), tau)
@@ -0,0 +1,204 @@
+"""Reuse of previously answered questions for paraphrased questionnaire items.
+
+AnswerMemory keeps an in-process embedding index of past questions that
+ended with an accepted answer (final == "answer" or a reviewer approval, and
+no later needs_info). Before the full Plane-A pipeline runs, the worker asks
+for the nearest remembered question; above PLANE_A_REUSE_THRESHOLD cosine
+similarity its answer and citations are reused. The answer is marked as
+reused (source question and similarity) and still goes through review; the
+source's approval is never copied. Reuse is off unless PLANE_A_REUSE=1.
+
+The memory refreshes from the database at most every PLANE_A_REUSE_REFRESH
+seconds and only embeds questions it has not seen before. An answer is only
+reused while every policy it cites still has the content hash recorded when
+it was answered (doc_sha256 in the payload); after a policy edit its quotes
+and offsets may no longer exist, so it is skipped.
+"""
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+
+from .db import session_scope
+from .embeddings import get_embedder
+from .models import Approval, Artifact, Question
+from .plane_a_index import get_index
+
+REUSE_ENABLED = os.getenv("PLANE_A_REUSE", "0") == "1"
+REUSE_THRESHOLD = float(os.getenv("PLANE_A_REUSE_THRESHOLD", "0.92"))
+REFRESH_SECONDS = float(os.getenv("PLANE_A_REUSE_REFRESH", "60"))
+ANSWER_STAGES = ("answering", "answering_retry")
+# Max ids per IN (...) when loading changed questions
+_LOAD_CHUNK = 500
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return get_embedder().encode(texts)
+
+
+def _best_answer(arts: List[Artifact]) -> Optional[Dict[str, Any]]:
+    """Pick the strongest non-empty answer among a question's answering passes"""
+    best = None
+    for a in arts:
+        payload = a.payload or {}
+        if not (payload.get("answer") or "").strip():
+            continue
+        if best is None or float(payload.get("answer_confidence", 0.0)) > float(best.get("answer_confidence", 0.0)):
+            best = payload
+    return best
+
+
+def _is_current(answer: Dict[str, Any], docs: Dict[str, Dict[str, str]]) -> bool:
+    """Whether every cited policy is unchanged in the current index manifest"""
+    cited = {c.get("doc_id") for c in answer.get("citations") or []}
+    recorded = answer.get("doc_sha256") or {}
+    # Answers recorded before doc hashes were kept cannot be checked
+    if not cited or set(recorded) != cited:
+        return False
+    return all(docs.get(doc_id, {}).get("sha256") == sha for doc_id, sha in recorded.items())
+
+
+class AnswerMemory:
+    """Embedding index over previously accepted answers."""
+
+    def __init__(self, threshold: float = REUSE_THRESHOLD, refresh_seconds: float = REFRESH_SECONDS) -> None:
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        # (entries, matrix) replaced as one tuple so lookups never see a torn update
+        self._snapshot = ([], np.empty((0, 0), dtype=np.float32))
+        # (final, answer artifact count, approval count) per final question at the last scan
+        self._seen: Dict[str, Tuple[Any, int, int]] = {}
+        self._last_refresh = 0.0
+
+    def refresh(self, force: bool = False) -> None:
+        if not force and time.time() - self._last_refresh < self.refresh_seconds:
+            return
+        with self._lock:
+            if not force and time.time() - self._last_refresh < self.refresh_seconds:
+                return
+            self._last_refresh = time.time()
+            with session_scope() as db:
+                self._load_changes(db)
+
+    def _signatures(self, db) -> Dict[str, Tuple[Any, int, int]]:
+        """Cheap per-question change signature of every final question.
+
+        Timestamps are not used: updated_at is stamped with the transaction
+        start, so a late commit could fall behind any watermark. Artifacts
+        and approvals are append-only, so their counts change on every
+        committed pipeline pass or review.
+        """
+        arts = dict(db.execute(
+            select(Artifact.question_id, func.count(Artifact.id))
+            .where(Artifact.stage.in_(ANSWER_STAGES))
+            .group_by(Artifact.question_id)
+        ).all())
+        approvals = dict(db.execute(
+            select(Approval.question_id, func.count(Approval.id)).group_by(Approval.question_id)
+        ).all())
+        return {
+            str(qid): (final, arts.get(qid, 0), approvals.get(qid, 0))
+            for qid, final in db.execute(select(Question.id, Question.final).where(Question.status == "final"))
+        }
+
+    def _load_changes(self, db) -> None:
+        sigs = self._signatures(db)
+        changed = [qid for qid, sig in sigs.items() if self._seen.get(qid) != sig]
+        removed = [qid for qid in self._seen if qid not in sigs]
+        self._seen = sigs
+        if not changed and not removed:
+            return
+        for qid in removed:
+            self._entries.pop(qid, None)
+            self._vectors.pop(qid, None)
+
+        for start in range(0, len(changed), _LOAD_CHUNK):
+            self._load_questions(db, [uuid.UUID(qid) for qid in changed[start:start + _LOAD_CHUNK]])
+
+        missing = [qid for qid in self._entries if qid not in self._vectors]
+        if missing:
+            for qid, vec in zip(missing, _encode([self._entries[qid]["text"] for qid in missing])):
+                self._vectors[qid] = vec
+        ids = list(self._entries)
+        matrix = np.stack([self._vectors[qid] for qid in ids]) if ids else np.empty((0, 0), dtype=np.float32)
+        self._snapshot = ([self._entries[qid] for qid in ids], matrix)
+
+    def _load_questions(self, db, ids: List[uuid.UUID]) -> None:
+        """Re-derive the memory entries of the given final questions"""
+        questions = db.query(Question).filter(Question.id.in_(ids)).all()
+        arts: Dict[Any, List[Artifact]] = {}
+        for a in db.query(Artifact).filter(Artifact.question_id.in_(ids), Artifact.stage.in_(ANSWER_STAGES)):
+            arts.setdefault(a.question_id, []).append(a)
+        latest: Dict[Any, Approval] = {}
+        for a in db.query(Approval).filter(Approval.question_id.in_(ids)).order_by(Approval.created_at):
+            latest[a.question_id] = a
+
+        for qq in questions:
+            qid = str(qq.id)
+            approval = latest.get(qq.id)
+            decision = approval.decision if approval else None
+            answer = _best_answer(arts.get(qq.id, []))
+            accepted = decision == "approve" or (qq.final == "answer" and decision != "needs_info")
+            if answer is None or not accepted:
+                # Rejected or unanswered since we last saw it
+                self._entries.pop(qid, None)
+                self._vectors.pop(qid, None)
+            else:
+                self._entries[qid] = {
+                    "question_id": qid,
+                    "run_id": str(qq.run_id),
+                    "text": qq.text,
+                    "answer": answer,
+                    "approval": decision,
+                    "approval_actor": approval.actor if approval else None,
+                }
+
+    def lookup(self, questions: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Best reusable prior answer per question, or None below the threshold"""
+        self.refresh()
+        entries, matrix = self._snapshot
+        index_data = get_index()
+        if not entries or not questions or index_data is None:
+            return [None] * len(questions)
+        docs = index_data["manifest"].get("docs", {})
+        current = np.array([_is_current(e["answer"], docs) for e in entries], dtype=bool)
+        sims = _encode(questions) @ matrix.T
+        # Answers quoting edited or removed policies never match
+        sims[:, ~current] = -np.inf
+        out: List[Optional[Dict[str, Any]]] = []
+        for row in sims:
+            j = int(np.argmax(row))
+            if float(row[j]) < self.threshold:
+                out.append(None)
+                continue
+            hit = dict(entries[j])
+            hit["similarity"] = float(row[j])
+            out.append(hit)
+        return out
+
+
+def reused_answer(hit: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer payload for a reuse hit, shaped like answer_pass_1 output"""
+    payload = dict(hit["answer"])
+    payload.pop("selected", None)  # set by the worker on its own artifact
+    payload["notes"] = "reused"
+    payload["reused"] = True
+    payload["reused_from"] = {
+        "question_id": hit["question_id"],
+        "run_id": hit["run_id"],
+        "question": hit["text"],
+        "similarity": hit["similarity"],
+        "source_approval": hit["approval"],  # for the reviewer's reference only
+    }
+    return payload
+
+
+# Singleton for workers
+memory = AnswerMemory()
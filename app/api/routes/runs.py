@@ -6,9 +6,13 @@ try:
     # Use strict Plane-A for document QA
     from ..plane_a_query import query_plane_a, health_check, warmup_models
     from ..plane_a_index import build_index
+    from ..plane_a_cache import cache as answer_cache
+    from ..embeddings import get_embedder
 except Exception:
     from app.api.plane_a_query import query_plane_a, health_check, warmup_models
     from app.api.plane_a_index import build_index
+    from app.api.plane_a_cache import cache as answer_cache
+    from app.api.embeddings import get_embedder
 
 
 router = APIRouter()
@@ -25,21 +29,37 @@ def plane_a_health(deep: bool = Query(False)) -> Dict[str, object]:
 @router.post("/plane-a/build-index", summary="Build Plane-A index")
 def build_plane_a_index(reset: bool = False) -> Dict[str, object]:
     """
-    Build or rebuild the Plane-A index from policies
+    Incrementally update the Plane-A index from policies, reusing vectors of
+    unchanged chunks (reset=true encodes every chunk with the model again)
     """
     try:
         idx = build_index(reset=reset)
-        # build_index returns a dict with keys: index, embeddings, metadata
-        count = len(idx.get("metadata", [])) if isinstance(idx, dict) else 0
-        return {"status": "ready", "indexed_chunks": count}
+        # build_index returns a dict with keys: index, metadata, manifest
+        if not isinstance(idx, dict):
+            return {"status": "ready", "indexed_chunks": 0}
+        manifest = idx["manifest"]
+        return {
+            "status": "ready",
+            "indexed_chunks": len(idx["metadata"]),
+            "version": manifest["version"],
+            "stats": manifest.get("stats", {}),
+        }
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
 
-@router.post("/plane-a/warmup", summary="Preload QA model into memory")
-def plane_a_warmup() -> Dict[str, object]:
-    """Load heavy QA model so first query is fast."""
-    return warmup_models()
+@router.post("/plane-a/warmup", summary="Preload Plane-A models into memory")
+def plane_a_warmup(background: bool = False) -> Dict[str, object]:
+    """Load the reader and embedding models so the first query is fast. Poll /api/ready when background=true."""
+    return warmup_models(background=background)
+
+
+@router.get("/plane-a/cache", summary="Plane-A answer cache statistics")
+def plane_a_cache_stats() -> Dict[str, object]:
+    """Hit/miss counters for the answer cache tiers and the embedding cache."""
+    stats = answer_cache.stats()
+    stats["embeddings"] = get_embedder().stats()
+    return stats
 
 
 @router.get("/plane-a/ask", summary="Query Plane-A with strict extractive QA")
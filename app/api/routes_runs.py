@@ -1,44 +1,102 @@
-from fastapi import APIRouter, HTTPException
+import os
+import uuid
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
 from typing import List, Dict
-from app.api.db import SessionLocal
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.api.db import get_async_db
 from app.api.models import Run, Question, Approval
-from app.api.workers import process_question
+from app.api.broker import enqueue_many
+from app.api.workers import process_question, process_run, export_run
+from app.api.events import init_run_progress, claim_export, get_export_status, set_export_status
 
 router = APIRouter()
 
+# "question" enqueues one message per question; "run" enqueues slices of
+# RUN_BATCH_SIZE questions that are embedded and read together
+RUN_MODE = os.getenv("SAFEFORMS_RUN_MODE", "question")
+RUN_BATCH_SIZE = int(os.getenv("SAFEFORMS_RUN_BATCH_SIZE", "32"))
+
+def _enqueue_run(run_id: uuid.UUID, ids: List[str], mode: str) -> None:
+    init_run_progress(run_id, len(ids))
+    if mode == "question":
+        enqueue_many(process_question, [(str(run_id), qid) for qid in ids])
+    else:
+        enqueue_many(process_run, [(str(run_id), ids[i:i+RUN_BATCH_SIZE]) for i in range(0, len(ids), RUN_BATCH_SIZE)])
+
 @router.post("/api/batch/run")
-def create_batch(payload: Dict):
+async def create_batch(payload: Dict, db: AsyncSession = Depends(get_async_db)):
     questions: List[str] = payload.get("questions") or []
     session_id: str = payload.get("session_id") or None
+    mode: str = payload.get("mode") or RUN_MODE
     if not questions:
         raise HTTPException(status_code=400, detail="questions required")
-    db = SessionLocal()
-    run = Run(session_id=session_id)
-    db.add(run); db.commit(); db.refresh(run)
-    created: List[Dict[str, str]] = []
-    for qtext in questions:
-        q = Question(run_id=run.id, text=qtext)
-        db.add(q); db.commit(); db.refresh(q)
-        created.append({"id": str(q.id), "text": q.text})
-        process_question.send(str(run.id), str(q.id))
-    return {"run_id": str(run.id), "questions": created}
+    if mode not in ("question", "run"):
+        raise HTTPException(status_code=400, detail="mode must be 'question' or 'run'")
+    # IDs are generated here so the run and all its questions go in with one
+    # multi-row INSERT per table inside a single transaction
+    run_id = uuid.uuid4()
+    rows = [{"id": uuid.uuid4(), "run_id": run_id, "text": qtext} for qtext in questions]
+    await db.execute(insert(Run), [{"id": run_id, "session_id": session_id}])
+    await db.execute(insert(Question), rows)
+    await db.commit()
+
+    ids = [str(r["id"]) for r in rows]
+    # Redis client and broker are synchronous; keep them off the event loop
+    await run_in_threadpool(_enqueue_run, run_id, ids, mode)
+    return {"run_id": str(run_id), "questions": [{"id": qid, "text": r["text"]} for qid, r in zip(ids, rows)]}
 
 @router.post("/api/review/{question_id}/approve")
-def approve(question_id: str, actor: str = "reviewer@example.com"):
-    db = SessionLocal()
+async def approve(question_id: uuid.UUID, actor: str = "reviewer@example.com", db: AsyncSession = Depends(get_async_db)):
     db.add(Approval(question_id=question_id, decision="approve", actor=actor))
-    db.commit()
+    await db.commit()
     return {"ok": True}
 
 @router.post("/api/review/{question_id}/needs-info")
-def needs_info(question_id: str, reason: str = "", actor: str = "reviewer@example.com"):
-    db = SessionLocal()
+async def needs_info(question_id: uuid.UUID, reason: str = "", actor: str = "reviewer@example.com", db: AsyncSession = Depends(get_async_db)):
     db.add(Approval(question_id=question_id, decision="needs_info", actor=actor, reason=reason))
-    db.commit()
+    await db.commit()
     return {"ok": True}
 
+def _start_export(run_id: str, version: str) -> Dict[str, str]:
+    if claim_export(run_id, version):
+        set_export_status(run_id, reset=True, version=version, status="queued")
+        export_run.send(run_id, version)
+    return get_export_status(run_id)
+
 @router.post("/api/runs/{run_id}/export")
-def export(run_id: str):
-    from app.api.pdf import generate_pdf
-    path = generate_pdf(run_id)
-    return {"status": "ready", "pdf": path}
+async def export(run_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    """Start (or reuse) a background PDF export for the run's current data"""
+    from app.api.pdf import data_version_async, export_path
+    run_id = str(run_id)
+    version = await data_version_async(db, run_id)
+    path = export_path(run_id, version)
+    if os.path.exists(path):
+        return {"status": "ready", "version": version, "pdf": path}
+    status = await run_in_threadpool(_start_export, run_id, version)
+    return JSONResponse({"status": status.get("status", "queued"), "version": version}, status_code=202)
+
+@router.get("/api/runs/{run_id}/export")
+async def export_status(run_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    from app.api.pdf import data_version_async, export_path
+    run_id = str(run_id)
+    version = await data_version_async(db, run_id)
+    path = export_path(run_id, version)
+    if os.path.exists(path):
+        return {"status": "ready", "version": version, "pdf": path}
+    status = await run_in_threadpool(get_export_status, run_id)
+    if status.get("version") != version:
+        # Nothing started for the current data (or the run changed since)
+        return {"status": "stale" if status else "none", "version": version}
+    return {**status, "version": version}
+
+@router.get("/api/runs/{run_id}/export/pdf")
+async def export_pdf(run_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    from app.api.pdf import data_version_async, export_path
+    run_id = str(run_id)
+    path = export_path(run_id, await data_version_async(db, run_id))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="export not ready; POST /api/runs/{run_id}/export first")
+    return FileResponse(path, media_type="application/pdf", filename=f"run-{run_id}.pdf")
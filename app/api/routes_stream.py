@@ -2,29 +2,74 @@ from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 import asyncio
 import os
-import redis
+from typing import Optional
+
+from app.api.stream_hub import hub, stream_id_key
 
 router = APIRouter()
-_pool = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+# Seconds without events before a heartbeat frame is sent; the dashboard
+# treats 30s of silence as a dead connection
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+def _frame(event_id: str, data: str) -> str:
+    if event_id:
+        return f"id: {event_id}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
 
 @router.get("/api/runs/{run_id}/stream")
-async def stream(run_id: str, request: Request):
-    pubsub = _pool.pubsub()
-    pubsub.subscribe(f"run:{run_id}")
+async def stream(run_id: str, request: Request, last_event_id: Optional[str] = None):
+    # Browsers send Last-Event-ID on reconnect; the query param lets the
+    # dashboard resume when it opens a fresh EventSource itself
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    try:
+        if resume_from:
+            stream_id_key(resume_from)
+    except ValueError:
+        resume_from = None  # malformed id: replay the whole log
 
     async def gen():
+        sub = None
         try:
+            # Subscribe before reading the log so nothing published in between
+            # is lost; inside the generator so the finally always unsubscribes
+            sub = hub.subscribe(run_id)
             yield "event: ping\ndata: {\"ok\":true}\n\n"
+            last_key = None
+            try:
+                backlog = await hub.replay(run_id, after=resume_from)
+            except Exception as e:
+                print(f"[Stream] Replay of run {run_id} failed: {e}")
+                backlog = []
+            for event_id, data in backlog:
+                yield _frame(event_id, data)
+            if backlog:
+                last_key = stream_id_key(backlog[-1][0])
+            elif resume_from:
+                last_key = stream_id_key(resume_from)
             while True:
-                if await request.is_disconnected():
-                    break
-                msg = pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if msg and msg["type"] == "message":
-                    yield f"data: {msg['data'].decode()}\n\n"
-                await asyncio.sleep(0.05)
+                try:
+                    event_id, data = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield "event: status\ndata: {\"type\":\"heartbeat\"}\n\n"
+                    continue
+                # Events already delivered (by the replay, or twice after a
+                # hub reconnect) are skipped
+                if event_id:
+                    key = stream_id_key(event_id)
+                    if last_key is not None and key <= last_key:
+                        continue
+                    last_key = key
+                yield _frame(event_id, data)
         finally:
-            try:
-                pubsub.close()
-            except Exception:
-                pass
+            if sub is not None:
+                hub.unsubscribe(sub)
     return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+@router.get("/api/stream/stats")
+def stream_stats():
+    return hub.stats()
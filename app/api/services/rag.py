@@ -1,14 +1,15 @@
 from __future__ import annotations
 import os
 import json
-import math
-from collections import Counter
-from typing import List, Tuple, Dict
+import hashlib
+import threading
+from typing import Any, List, Tuple, Dict, Optional
+from ..lexical_index import BM25Index, chunk_text
 
 POLICY_DIR = "app/api/pseudo_dataset/policies"
 QUESTIONNAIRE_DIR = "app/api/pseudo_dataset/incoming_questionnaires"
 
-# Try to use ChromaDB if available; otherwise fall back to stdlib cosine.
+# Try to use ChromaDB if available; otherwise fall back to chunk-level BM25.
 _HAS_CHROMA = False
 try:
     import chromadb  # type: ignore
@@ -40,38 +41,17 @@ def _read_questions() -> List[Tuple[str, str]]:
     return items
 
 
-# ---- Stdlib cosine fallback ----
-def _tokenize(text: str) -> List[str]:
-    return [t for t in ''.join(ch.lower() if ch.isalnum() else ' ' for ch in text).split() if t]
-
-
-def _to_vec(tokens: List[str]) -> Counter:
-    return Counter(tokens)
-
-
-def _cosine(a: Counter, b: Counter) -> float:
-    if not a or not b:
-        return 0.0
-    dot = sum(a[k] * b.get(k, 0) for k in a)
-    if dot == 0:
-        return 0.0
-    na = math.sqrt(sum(v * v for v in a.values()))
-    nb = math.sqrt(sum(v * v for v in b.values()))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
-
-
-def _best_policy_cosine(question: str, policies: Dict[str, str]) -> Tuple[str, float]:
-    qv = _to_vec(_tokenize(question))
-    best_name = ""
-    best_score = 0.0
-    for name, text in policies.items():
-        pv = _to_vec(_tokenize(text))
-        s = _cosine(qv, pv)
-        if s > best_score:
-            best_name, best_score = name, s
-    return best_name, best_score
+# ---- BM25 fallback ----
+def _best_policies_bm25(questions: List[str], index: BM25Index, chunk_docs: List[str]) -> List[Tuple[str, float]]:
+    """Best policy per question: the document owning the top-scoring chunk,
+    with the chunk's BM25 confidence. All questions are scored in one batch."""
+    if not questions or not len(index):
+        return [("", 0.0)] * len(questions)
+    conf, idx = index.search(questions, k=1)
+    return [
+        (chunk_docs[i], float(c)) if i >= 0 else ("", 0.0)
+        for i, c in zip(idx[:, 0], conf[:, 0])
+    ]
 
 
 def _best_policy_chroma(question: str, collection) -> Tuple[str, float]:
@@ -85,18 +65,96 @@ def _best_policy_chroma(question: str, collection) -> Tuple[str, float]:
     return "", 0.0
 
 
+# ---- Long-lived policy store ----
+CHROMA_DIR = os.getenv("RAG_CHROMA_DIR", "./.chroma")
+
+
+def _fingerprint() -> Tuple[Tuple[str, int, int], ...]:
+    """(name, mtime_ns, size) of every policy file; cheap enough to check per query"""
+    out = []
+    for fname in sorted(os.listdir(POLICY_DIR)):
+        if fname.endswith(".md"):
+            st = os.stat(os.path.join(POLICY_DIR, fname))
+            out.append((fname, st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+class PolicyStore:
+    """Policies, a chunk-level BM25 index over them and (if available) a
+    persistent Chroma collection, rebuilt only when policy files change.
+    Unchanged policies keep their chunks; the BM25 index itself is rebuilt
+    from all chunks since its idf statistics are corpus-wide.
+
+    Chroma documents carry a sha256 of their text, so unchanged policies are
+    never re-upserted (and never re-embedded), even across restarts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[Tuple] = None
+        self.policies: Dict[str, str] = {}
+        self._doc_chunks: Dict[str, List[str]] = {}
+        # (BM25 index over all chunks, policy name of each chunk), swapped as one
+        self.lexical: Tuple[BM25Index, List[str]] = (BM25Index(), [])
+        self._collection = None
+
+    def collection(self):
+        if self._collection is None:
+            if hasattr(chromadb, "PersistentClient"):
+                client = chromadb.PersistentClient(path=CHROMA_DIR)  # type: ignore
+            else:
+                client = chromadb.Client()  # type: ignore
+            self._collection = client.get_or_create_collection(name="policy_collection")
+        return self._collection
+
+    def refresh(self) -> None:
+        fp = _fingerprint()
+        if fp == self._fingerprint:
+            return
+        with self._lock:
+            if fp == self._fingerprint:
+                return
+            policies = _read_policies()
+            changed = [n for n, t in policies.items() if self.policies.get(n) != t]
+            removed = [n for n in self.policies if n not in policies]
+            doc_chunks = {n: c for n, c in self._doc_chunks.items() if n in policies and n not in changed}
+            for name in changed:
+                doc_chunks[name] = [text for _, _, text in chunk_text(policies[name])]
+            chunk_docs = [n for n in sorted(doc_chunks) for _ in doc_chunks[n]]
+            lexical = BM25Index.build([t for n in sorted(doc_chunks) for t in doc_chunks[n]])
+            if _HAS_CHROMA:
+                self._sync_chroma(policies, removed)
+            self.policies, self._doc_chunks, self._fingerprint = policies, doc_chunks, fp
+            self.lexical = (lexical, chunk_docs)
+
+    def _sync_chroma(self, policies: Dict[str, str], removed: List[str]) -> None:
+        collection = self.collection()
+        hashes = {n: hashlib.sha256(t.encode("utf-8")).hexdigest() for n, t in policies.items()}
+        stored = collection.get(ids=list(policies), include=["metadatas"])
+        have = {i: (m or {}).get("sha256") for i, m in zip(stored.get("ids") or [], stored.get("metadatas") or [])}
+        stale = [n for n in policies if have.get(n) != hashes[n]]
+        if stale:
+            collection.upsert(
+                documents=[policies[n] for n in stale],
+                ids=stale,
+                metadatas=[{"sha256": hashes[n]} for n in stale],
+            )
+        gone = [i for i in collection.get(include=[]).get("ids") or [] if i not in policies]
+        if gone or removed:
+            collection.delete(ids=sorted(set(gone) | set(removed)))
+
+
+# Singleton for app
+store = PolicyStore()
+
+
 def run() -> List[Dict[str, object]]:
     questions = _read_questions()
     results: List[Dict[str, object]] = []
 
+    store.refresh()
     if _HAS_CHROMA:
-        # Build a Chroma in-memory collection from policies
-        client = chromadb.Client()  # type: ignore
-        collection = client.get_or_create_collection(name="policy_collection")
-        # Upsert policies
-        for fname, text in _read_policies().items():
-            collection.upsert(documents=[text], ids=[fname])
-
+        collection = store.collection()
         for q, src in questions:
             name, score = _best_policy_chroma(q, collection)
             results.append({
@@ -108,16 +166,15 @@ def run() -> List[Dict[str, object]]:
             })
         return results
 
-    # Fallback: stdlib cosine
-    policies = _read_policies()
-    for q, src in questions:
-        name, score = _best_policy_cosine(q, policies)
+    # Fallback: BM25, every question scored in one batch
+    best = _best_policies_bm25([q for q, _ in questions], *store.lexical)
+    for (q, src), (name, score) in zip(questions, best):
         results.append({
             "question": q,
             "source_questionnaire": src,
             "best_policy": name,
             "confidence": score,
-            "engine": "cosine",
+            "engine": "bm25",
         })
     return results
 
@@ -128,33 +185,24 @@ if __name__ == "__main__":
         print(json.dumps(row, ensure_ascii=False))
 
 
-from typing import Any, Optional
-
-
 def query(q: str, history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, object]:
     """Single-query RAG entrypoint used by `/api/runs/ask`.
     Returns retrieval metadata and, if available, an LLM-generated structured answer with action.
     """
     # Retrieve best policy by similarity
-    retrieval_engine = "cosine"
+    retrieval_engine = "bm25"
     name: str
     score: float
     policy_text: str = ""
 
+    # Policies are re-read (and re-embedded) only when files change
+    store.refresh()
     if _HAS_CHROMA:
-        client = chromadb.Client()  # type: ignore
-        collection = client.get_or_create_collection(name="policy_collection")
-        # Ensure policies are present (idempotent upserts)
-        policies_map = _read_policies()
-        for fname, text in policies_map.items():
-            collection.upsert(documents=[text], ids=[fname])
-        name, score = _best_policy_chroma(q, collection)
+        name, score = _best_policy_chroma(q, store.collection())
         retrieval_engine = "chroma"
-        policy_text = policies_map.get(name, "")
     else:
-        policies_map = _read_policies()
-        name, score = _best_policy_cosine(q, policies_map)
-        policy_text = policies_map.get(name, "")
+        (name, score), = _best_policies_bm25([q], *store.lexical)
+    policy_text = store.policies.get(name, "")
 
     # Generate answer using OpenAI if API key is present
     answer: str = ""
@@ -0,0 +1,178 @@
+"""In-process fan-out of run events to SSE clients.
+
+Each API process holds a single redis.asyncio pattern subscription on
+``run:*`` and dispatches every message to the bounded queues of the clients
+watching that run. Delivery is push-driven, and the number of Redis
+connections stays at one per process no matter how many reviewers watch.
+A slow client never blocks the others: when its queue is full the oldest
+pending event is dropped and counted.
+
+Published messages are "<stream id>\n<json>" (see events.publish_event); the
+same events are kept in a per-run Redis Stream, which replay() reads so a
+client can resume from its Last-Event-ID. The hub also replays from it
+after its own subscription reconnects, so events published during the
+outage still reach connected clients.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+CHANNEL_PREFIX = "run:"
+LOG_SUFFIX = ":log"
+REPLAY_BATCH = 500
+# After a reconnect, runs with no event seen yet are replayed from this many
+# ms before the subscription was lost (covers API/Redis clock skew)
+CATCH_UP_MARGIN_MS = 5000
+
+# (stream id, JSON payload); the id is "" for messages published without one
+Event = Tuple[str, str]
+
+
+def split_message(raw: str) -> Event:
+    if raw.startswith("{"):
+        return "", raw
+    event_id, _, data = raw.partition("\n")
+    return event_id, data
+
+
+def stream_id_key(event_id: str) -> Tuple[int, int]:
+    """Order-preserving key for Redis Stream ids ("<ms>-<seq>")"""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+QUEUE_SIZE = int(os.getenv("SSE_CLIENT_BUFFER", "256"))
+
+
+class Subscriber:
+    """One SSE client's bounded event buffer."""
+
+    def __init__(self, run_id: str, maxsize: int = QUEUE_SIZE) -> None:
+        self.run_id = run_id
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, data: Event) -> None:
+        if self.queue.full():
+            # Backpressure: shed the oldest event rather than stall the hub
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(data)
+
+
+class RunStreamHub:
+    """Shares one pattern subscription among all SSE clients in the process."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._subs: Dict[str, Set[Subscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._client = None
+        # Last stream id dispatched per watched run, where gap replay resumes
+        self._last_ids: Dict[str, str] = {}
+
+    def subscribe(self, run_id: str) -> Subscriber:
+        sub = Subscriber(run_id)
+        self._subs.setdefault(run_id, set()).add(sub)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self._subs.get(sub.run_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.run_id]
+                self._last_ids.pop(sub.run_id, None)
+
+    def dispatch(self, run_id: str, data: Event) -> None:
+        subs = self._subs.get(run_id)
+        if not subs:
+            return
+        if data[0]:
+            self._last_ids[run_id] = data[0]
+        for sub in list(subs):
+            sub.push(data)
+
+    async def replay(self, run_id: str, after: Optional[str] = None) -> List[Event]:
+        """Logged events of a run, oldest first, strictly after the given id"""
+        if self._client is None:
+            import redis.asyncio as aioredis
+            self._client = aioredis.Redis.from_url(self.url)
+        key = f"{CHANNEL_PREFIX}{run_id}{LOG_SUFFIX}"
+        start = f"({after}" if after else "-"
+        out: List[Event] = []
+        while True:
+            entries = await self._client.xrange(key, min=start, max="+", count=REPLAY_BATCH)
+            for entry_id, fields in entries:
+                out.append((entry_id.decode(), fields[b"data"].decode()))
+            if len(entries) < REPLAY_BATCH:
+                return out
+            start = f"({out[-1][0]}"
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "runs": len(self._subs),
+            "clients": sum(len(s) for s in self._subs.values()),
+            "listening": int(self._task is not None and not self._task.done()),
+        }
+
+    async def _catch_up(self, lost_ms: int) -> None:
+        """Dispatch events logged while the subscription was down.
+
+        Clients drop ids they already delivered, so overlap with buffered
+        live messages is harmless.
+        """
+        for run_id in list(self._subs):
+            after = self._last_ids.get(run_id) or f"{max(lost_ms - CATCH_UP_MARGIN_MS, 0)}-0"
+            try:
+                missed = await self.replay(run_id, after=after)
+            except Exception as e:
+                print(f"[Stream] Catch-up of run {run_id} failed: {e}")
+                continue
+            for evt in missed:
+                self.dispatch(run_id, evt)
+
+    async def _listen(self) -> None:
+        import redis.asyncio as aioredis
+
+        backoff = 0.5
+        lost_ms: Optional[int] = None
+        while True:
+            client = aioredis.Redis.from_url(self.url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                backoff = 0.5
+                if lost_ms is not None:
+                    # Live messages published from here on are buffered by pubsub
+                    await self._catch_up(lost_ms)
+                    lost_ms = None
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "pmessage":
+                        continue
+                    channel = msg["channel"].decode()
+                    self.dispatch(channel[len(CHANNEL_PREFIX):], split_message(msg["data"].decode()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if lost_ms is None:
+                    lost_ms = int(time.time() * 1000)
+                print(f"[Stream] Redis subscription lost ({e}); reconnecting in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+
+# Singleton for app
+hub = RunStreamHub(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
@@ -0,0 +1,228 @@
+"""Dense vector indexes for Plane-A retrieval.
+
+Embeddings are L2-normalized, so cosine similarity is a plain dot product.
+Every index answers a whole matrix of queries at once and returns cosine
+*distances* (1 - similarity), matching what sklearn's cosine kNN returned.
+"""
+import os
+from typing import Optional, Tuple
+import numpy as np
+
+# Rows scored per block when the stored matrix is not float32, so the
+# temporary float32 copy stays small regardless of corpus size
+_BLOCK_ROWS = 16384
+
+
+def top_k(sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k (scores, indices) of a (n_queries, n_rows) score
+    matrix, best first; also used by the BM25 index"""
+    k = min(k, sims.shape[1])
+    if k <= 0:
+        empty = np.empty((sims.shape[0], 0))
+        return empty, empty.astype(np.int64)
+    if k < sims.shape[1]:
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(sims.shape[1]), sims.shape).copy()
+    part_sims = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_sims, axis=1, kind="stable")
+    return np.take_along_axis(part_sims, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class VectorIndex:
+    """Common interface for all Plane-A vector indexes."""
+
+    kind = "base"
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, indices), each shaped (n_queries, k)"""
+        raise NotImplementedError
+
+    def reconstruct(self, rows: np.ndarray) -> np.ndarray:
+        """Return the stored vectors of the given rows as float32"""
+        raise NotImplementedError
+
+    def save(self, path: str) -> None:
+        """Write the index as raw .npy arrays into directory path"""
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorIndex":
+        """Open an index written by save(); arrays are memory-mapped by default"""
+        raise NotImplementedError
+
+
+class FlatIndex(VectorIndex):
+    """Exact search: one matrix product plus argpartition top-k.
+
+    dtype controls how the matrix is stored: "float32" (exact), "float16"
+    (half the memory) or "int8" (a quarter, with a per-row scale).
+    """
+
+    kind = "flat"
+
+    def __init__(self, embeddings: np.ndarray, dtype: str = "float32") -> None:
+        emb = np.asarray(embeddings, dtype=np.float32)
+        self.dtype = dtype
+        self.dim = emb.shape[1]
+        self.scale: Optional[np.ndarray] = None
+        if dtype == "float32":
+            self.matrix = np.ascontiguousarray(emb)
+        elif dtype == "float16":
+            self.matrix = emb.astype(np.float16)
+        elif dtype == "int8":
+            # Symmetric per-row quantization: row ~= codes * scale
+            scale = np.abs(emb).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            self.matrix = np.round(emb / scale[:, None]).astype(np.int8)
+            self.scale = scale.astype(np.float32)
+        else:
+            raise ValueError(f"unsupported index dtype: {dtype}")
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarities of queries against all (or the given) rows"""
+        q = np.asarray(queries, dtype=np.float32)
+        mat = self.matrix if rows is None else self.matrix[rows]
+        scale = self.scale if rows is None or self.scale is None else self.scale[rows]
+        if mat.dtype == np.float32:
+            return q @ mat.T
+        out = np.empty((q.shape[0], mat.shape[0]), dtype=np.float32)
+        for i in range(0, mat.shape[0], _BLOCK_ROWS):
+            block = mat[i:i + _BLOCK_ROWS].astype(np.float32)
+            out[:, i:i + _BLOCK_ROWS] = q @ block.T
+        if scale is not None:
+            out *= scale[None, :]
+        return out
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        sims, idx = top_k(self.scores(queries), k)
+        return 1.0 - sims, idx
+
+    def reconstruct(self, rows: np.ndarray) -> np.ndarray:
+        vecs = np.asarray(self.matrix[rows], dtype=np.float32)
+        if self.scale is not None:
+            vecs = vecs * self.scale[rows][:, None]
+        return vecs
+
+    def save(self, path: str) -> None:
+        np.save(os.path.join(path, "embeddings.npy"), self.matrix)
+        if self.scale is not None:
+            np.save(os.path.join(path, "scale.npy"), self.scale)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FlatIndex":
+        mode = "r" if mmap else None
+        obj = cls.__new__(cls)
+        obj.matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode=mode)
+        obj.dtype = str(obj.matrix.dtype)
+        obj.dim = obj.matrix.shape[1]
+        scale_path = os.path.join(path, "scale.npy")
+        obj.scale = np.load(scale_path, mmap_mode=mode) if os.path.exists(scale_path) else None
+        return obj
+
+
+def _spherical_kmeans(x: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # Re-seed empty clusters so every list stays useful
+                centroids[c] = x[rng.integers(len(x))]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """Approximate search with an inverted file over spherical k-means cells.
+
+    Each query is scored only against the rows of its nprobe closest cells,
+    so cost grows with corpus_size * nprobe / nlist instead of corpus_size.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, embeddings: np.ndarray, dtype: str = "float32",
+                 nlist: Optional[int] = None, nprobe: int = 8) -> None:
+        emb = np.asarray(embeddings, dtype=np.float32)
+        self.flat = FlatIndex(emb, dtype=dtype)
+        self.nlist = max(1, min(len(emb), nlist or int(np.sqrt(len(emb)))))
+        self.nprobe = nprobe
+        self.centroids = _spherical_kmeans(emb, self.nlist)
+        assign = np.argmax(emb @ self.centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        # CSR-style inverted lists: rows of cell c are order[offsets[c]:offsets[c+1]]
+        self.list_rows = order.astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))])
+
+    def __len__(self) -> int:
+        return len(self.flat)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.asarray(queries, dtype=np.float32)
+        nprobe = min(self.nprobe, self.nlist)
+        cells = np.argpartition(-(q @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        k = min(k, len(self))
+        dists = np.full((len(q), k), np.inf)
+        idx = np.full((len(q), k), -1, dtype=np.int64)
+        for i, row_cells in enumerate(cells):
+            rows = np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in row_cells])
+            if not len(rows):
+                continue
+            sims, local = top_k(self.flat.scores(q[i:i + 1], rows), k)
+            dists[i, :sims.shape[1]] = 1.0 - sims[0]
+            idx[i, :sims.shape[1]] = rows[local[0]]
+        return dists, idx
+
+    def reconstruct(self, rows: np.ndarray) -> np.ndarray:
+        return self.flat.reconstruct(rows)
+
+    def save(self, path: str) -> None:
+        self.flat.save(path)
+        np.save(os.path.join(path, "ivf_centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "ivf_rows.npy"), self.list_rows)
+        np.save(os.path.join(path, "ivf_offsets.npy"), self.list_offsets)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        mode = "r" if mmap else None
+        obj = cls.__new__(cls)
+        obj.flat = FlatIndex.load(path, mmap=mmap)
+        # Centroids are tiny and touched by every query; keep them in memory
+        obj.centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+        obj.list_rows = np.load(os.path.join(path, "ivf_rows.npy"), mmap_mode=mode)
+        obj.list_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+        obj.nlist = len(obj.centroids)
+        obj.nprobe = int(os.getenv("PLANE_A_IVF_NPROBE", "8"))
+        return obj
+
+
+_KINDS = {cls.kind: cls for cls in (FlatIndex, IVFIndex)}
+
+
+def load_index(path: str, kind: str, mmap: bool = True) -> VectorIndex:
+    """Open a saved index of the given kind"""
+    if kind not in _KINDS:
+        raise ValueError(f"unsupported index kind: {kind}")
+    return _KINDS[kind].load(path, mmap=mmap)
+
+
+def make_index(embeddings: np.ndarray, kind: Optional[str] = None, dtype: Optional[str] = None) -> VectorIndex:
+    """Build the configured index type (PLANE_A_INDEX_KIND / PLANE_A_INDEX_DTYPE)"""
+    kind = kind or os.getenv("PLANE_A_INDEX_KIND", "flat")
+    dtype = dtype or os.getenv("PLANE_A_INDEX_DTYPE", "float32")
+    if kind == "flat":
+        return FlatIndex(embeddings, dtype=dtype)
+    if kind == "ivf":
+        return IVFIndex(embeddings, dtype=dtype, nprobe=int(os.getenv("PLANE_A_IVF_NPROBE", "8")))
+    raise ValueError(f"unsupported index kind: {kind}")
@@ -1,12 +1,22 @@
 import json
 import hashlib
+import os
 import time
+import uuid
+from typing import List
 import dramatiq
 
-from app.api.events import publish_event
-from app.api.db import SessionLocal
+from app.api.events import EXPORT_TIME_LIMIT, get_publisher, publish_run_event, set_export_status, release_export
+from app.api.db import session_scope
 from app.api.models import Question, Artifact
-from app.api.agents import answer_pass_1, answer_pass_2, review_answer, assess_risk
+from app.api.agents import answer_pass_1_batch, answer_pass_2_batch, review_answer, assess_risk
+from app.api.plane_a_reuse import REUSE_ENABLED, memory as answer_memory, reused_answer
+from app.api.model_registry import registry
+
+
+# Load models while the worker waits for its first message
+if os.getenv("PLANE_A_WARMUP") == "1":
+    registry.warmup(background=True)
 
 
 def _run_hash(artifacts):
@@ -14,78 +24,191 @@ def _run_hash(artifacts):
     return hashlib.sha256(blob).hexdigest()[:16]
 
 
-@dramatiq.actor(max_retries=0)
-def process_question(run_id: str, question_id: str):
+def _reuse_lookup(qs):
+    if not REUSE_ENABLED:
+        return [None] * len(qs)
+    try:
+        return answer_memory.lookup([q.text for q in qs])
+    except Exception as e:
+        # Reuse is an optimization; fall back to the full pipeline
+        print(f"[Worker] Answer reuse lookup failed: {e}")
+        return [None] * len(qs)
+
+
+def _process(db, run_id: str, qs):
+    """Run the answer/review/retry/risk/final pipeline for a batch of questions.
+
+    Pass 1 and the retry pass are answered for the whole batch at once; every
+    question still gets its own Artifacts and stage events in the usual order.
+    Events go through the thread's coalescing publisher, which is flushed
+    before each slow step and once at the end. Artifacts, approvals and the
+    questions' final state are only added to the session and written in one
+    transaction at the end; final events are published after that commit.
+
+    The caller must have committed its reads (with expire_on_commit=False):
+    no statement runs on db until that final commit, so no connection is
+    held and no transaction is open while the models run, and updated_at
+    is stamped at write time rather than when the job started.
+    """
+    pub = get_publisher()
+    try:
+        _run_stages(db, pub, run_id, qs)
+    finally:
+        pub.flush()
+
+
+def _run_stages(db, pub, run_id: str, qs):
+    n = len(qs)
     start_time = time.time()
-    print(f"[Worker] RunID={run_id} QID={question_id}: Starting processing...")
-    db = SessionLocal()
-    q = db.query(Question).get(question_id)
-    if not q:
-        return
 
     # Answer pass 1
-    print(f"[Worker] RunID={run_id} QID={question_id}: Starting Answer Pass 1...")
+    print(f"[Worker] RunID={run_id} n={n}: Starting Answer Pass 1...")
     t0 = time.time()
-    publish_event(run_id, question_id, "answering", "answering")
-    ans = answer_pass_1(q.text)
-    db.add(Artifact(question_id=question_id, stage="answering", payload=ans, latency_ms=int((time.time()-t0)*1000)))
-    db.commit()
-    print(f"[Worker] RunID={run_id} QID={question_id}: Finished Answer Pass 1 in {time.time() - t0:.2f}s")
+    for q in qs:
+        pub.emit(run_id, q.id, "answering", "answering")
+    pub.flush()
+    # Paraphrases of previously accepted answers skip retrieval and the reader
+    hits = _reuse_lookup(qs)
+    fresh = [i for i, hit in enumerate(hits) if hit is None]
+    answers = [reused_answer(hit) if hit else None for hit in hits]
+    for i, ans in zip(fresh, answer_pass_1_batch([qs[i].text for i in fresh]) if fresh else []):
+        answers[i] = ans
+    # Batched inference has no per-question timing; record the amortized cost
+    answer_ms = int((time.time()-t0)*1000/n)
+    # Reused answers are marked in their payload (reused_from) and still go
+    # to human review; the source question's approval is never copied
+    chosen = []
+    for q, ans in zip(qs, answers):
+        chosen.append(Artifact(question_id=q.id, stage="answering", payload=ans, latency_ms=answer_ms))
+        db.add(chosen[-1])
+    if len(fresh) < n:
+        print(f"[Worker] RunID={run_id} n={n - len(fresh)}: Reused prior answers")
+    print(f"[Worker] RunID={run_id} n={n}: Finished Answer Pass 1 in {time.time() - t0:.2f}s")
 
     # Review
-    print(f"[Worker] RunID={run_id} QID={question_id}: Starting Review...")
-    t1 = time.time()
-    rev = review_answer(ans)
-    db.add(Artifact(question_id=question_id, stage="review", payload=rev, latency_ms=int((time.time()-t1)*1000)))
-    db.commit()
-    publish_event(run_id, question_id, "review", "reviewed", {"verification_conf": rev.get("verification_conf", 0.0)})
-    print(f"[Worker] RunID={run_id} QID={question_id}: Finished Review in {time.time() - t1:.2f}s")
+    reviews = []
+    for q, ans in zip(qs, answers):
+        t1 = time.time()
+        rev = review_answer(ans)
+        db.add(Artifact(question_id=q.id, stage="review", payload=rev, latency_ms=int((time.time()-t1)*1000)))
+        pub.emit(run_id, q.id, "review", "reviewed", {"verification_conf": rev.get("verification_conf", 0.0)})
+        reviews.append(rev)
+    pub.maybe_flush()
 
     # Retry if weak
-    if float(rev.get("verification_conf", 0.0)) < 0.70:
-        print(f"[Worker] RunID={run_id} QID={question_id}: Retrying due to low confidence...")
+    weak = [i for i, rev in enumerate(reviews) if float(rev.get("verification_conf", 0.0)) < 0.70 and hits[i] is None]
+    if weak:
+        print(f"[Worker] RunID={run_id} n={len(weak)}: Retrying due to low confidence...")
         retry_start_time = time.time()
-        publish_event(run_id, question_id, "answering", "retrying")
-        ans2 = answer_pass_2(q.text)
-        db.add(Artifact(question_id=question_id, stage="answering_retry", payload=ans2))
+        for i in weak:
+            pub.emit(run_id, qs[i].id, "answering", "retrying")
+        pub.flush()
+        retries = answer_pass_2_batch([qs[i].text for i in weak])
+        retry_ms = int((time.time()-retry_start_time)*1000/len(weak))
+        for i, ans2 in zip(weak, retries):
+            q, rev = qs[i], reviews[i]
+            retry_art = Artifact(question_id=q.id, stage="answering_retry", payload=ans2, latency_ms=retry_ms)
+            db.add(retry_art)
+            t1 = time.time()
+            rev2 = review_answer(ans2)
+            db.add(Artifact(question_id=q.id, stage="review", payload=rev2, latency_ms=int((time.time()-t1)*1000)))
+            pub.emit(run_id, q.id, "review", "reviewed", {"verification_conf": rev2.get("verification_conf", 0.0), "retry": True})
+            if float(rev2.get("verification_conf", 0.0)) > float(rev.get("verification_conf", 0.0)):
+                answers[i], reviews[i], chosen[i] = ans2, rev2, retry_art
+        pub.maybe_flush()
+        print(f"[Worker] RunID={run_id} n={len(weak)}: Finished Retry in {time.time() - retry_start_time:.2f}s")
+
+    # The report shows the answer the final decision was based on
+    for art in chosen:
+        art.payload = {**art.payload, "selected": True}
+
+    finals = []
+    for q, ans, rev in zip(qs, answers, reviews):
+        # Risk
+        t2 = time.time()
+        risk = assess_risk(ans)
+        db.add(Artifact(question_id=q.id, stage="risk", payload=risk, latency_ms=int((time.time()-t2)*1000)))
+        pub.emit(run_id, q.id, "risk", "risked", {"severity": risk.get("severity", "low")})
+
+        # Final decision
+        decision = "answer" if (float(ans.get("answer_confidence", 0.0))>=0.65 and float(rev.get("verification_conf", 0.0))>=0.70 and risk.get("severity")!="high" and not risk.get("needs_human")) else "needs_info"
+        q.status, q.final = "final", decision
+        q.verify_conf = int(float(rev.get("verification_conf", 0.0))*100)
+        q.risk_severity = str(risk.get("severity", "low"))
+
+        # Proof bundle + run hash; citations (with their quotes) are sent once
+        artifacts = [ans, rev, risk]
+        bundle = {
+            "decision": decision,
+            "answer": ans.get("answer", ""),
+            "answer_confidence": float(ans.get("answer_confidence", 0.0)),
+            "verification_conf": float(rev.get("verification_conf", 0.0)),
+            "citations": ans.get("citations", []),
+            "proof": {"run_hash": _run_hash(artifacts)},
+        }
+        if ans.get("reused"):
+            bundle["reused_from"] = ans["reused_from"]
+        finals.append((q.id, bundle))
+
+    # One transaction for every Artifact and status update of the
+    # batch; the unit of work sends the Artifact rows as a multi-row INSERT
+    t3 = time.time()
+    try:
         db.commit()
-        rev2 = review_answer(ans2)
-        db.add(Artifact(question_id=question_id, stage="review", payload=rev2))
+    except Exception:
+        db.rollback()
+        raise
+    print(f"[Worker] RunID={run_id} n={n}: Persisted results in {time.time() - t3:.2f}s")
+    for qid, bundle in finals:
+        pub.emit(run_id, qid, "final", "final", bundle)
+    print(f"[Worker] RunID={run_id} n={n}: Total processing time: {time.time() - start_time:.2f}s")
+
+
+@dramatiq.actor(max_retries=0)
+def process_question(run_id: str, question_id: str):
+    print(f"[Worker] RunID={run_id} QID={question_id}: Starting processing...")
+    with session_scope(expire_on_commit=False) as db:
+        q = db.get(Question, uuid.UUID(question_id))
+        if not q:
+            return
+        # End the read transaction; no connection is held during inference
         db.commit()
-        publish_event(run_id, question_id, "review", "reviewed", {"verification_conf": rev2.get("verification_conf", 0.0), "retry": True})
-        if float(rev2.get("verification_conf", 0.0)) > float(rev.get("verification_conf", 0.0)):
-            ans, rev = ans2, rev2
-        print(f"[Worker] RunID={run_id} QID={question_id}: Finished Retry in {time.time() - retry_start_time:.2f}s")
-
-    # Risk
-    print(f"[Worker] RunID={run_id} QID={question_id}: Starting Risk Assessment...")
-    t2 = time.time()
-    risk = assess_risk(ans)
-    db.add(Artifact(question_id=question_id, stage="risk", payload=risk, latency_ms=int((time.time()-t2)*1000)))
-    db.commit()
-    publish_event(run_id, question_id, "risk", "risked", {"severity": risk.get("severity", "low")})
-    print(f"[Worker] RunID={run_id} QID={question_id}: Finished Risk Assessment in {time.time() - t2:.2f}s")
-
-    # Final decision
-    decision = "answer" if (float(ans.get("answer_confidence", 0.0))>=0.65 and float(rev.get("verification_conf", 0.0))>=0.70 and risk.get("severity")!="high" and not risk.get("needs_human")) else "needs_info"
-    q.status, q.final = "final", decision
-    q.verify_conf = int(float(rev.get("verification_conf", 0.0))*100)
-    q.risk_severity = str(risk.get("severity", "low"))
-    db.commit()
-    print(f"[Worker] RunID={run_id} QID={question_id}: Total processing time: {time.time() - start_time:.2f}s")
-
-    # Proof bundle + run hash
-    artifacts = [ans, rev, risk]
-    bundle = {
-        "decision": decision,
-        "answer": ans.get("answer", ""),
-        "answer_confidence": float(ans.get("answer_confidence", 0.0)),
-        "verification_conf": float(rev.get("verification_conf", 0.0)),
-        "citations": ans.get("citations", []),
-        "proof": {
-            "citations": ans.get("citations", []),
-            "quotes": [c.get("quote", "") for c in ans.get("citations", [])],
-            "run_hash": _run_hash(artifacts),
-        },
-    }
-    publish_event(run_id, question_id, "final", "final", bundle)
+        _process(db, run_id, [q])
+
+
+@dramatiq.actor(max_retries=0, time_limit=60 * 60 * 1000)
+def process_run(run_id: str, question_ids: List[str]):
+    """Answer a slice of a run's questions with batched embedding and reader passes."""
+    print(f"[Worker] RunID={run_id}: Starting batch of {len(question_ids)} questions...")
+    with session_scope(expire_on_commit=False) as db:
+        by_id = {str(q.id): q for q in db.query(Question).filter(Question.id.in_([uuid.UUID(qid) for qid in question_ids])).all()}
+        qs = [by_id[qid] for qid in question_ids if qid in by_id]
+        if not qs:
+            return
+        # End the read transaction; no connection is held during inference
+        db.commit()
+        _process(db, run_id, qs)
+
+
+@dramatiq.actor(max_retries=0, time_limit=EXPORT_TIME_LIMIT * 1000)
+def export_run(run_id: str, version: str):
+    """Render a run's PDF report for one data version, reporting progress on the run stream."""
+    from app.api.pdf import generate_pdf
+
+    def progress(status: str, **extra):
+        set_export_status(run_id, version=version, status=status, **extra)
+        publish_run_event(run_id, "export_progress", version=version, status=status, **extra)
+
+    print(f"[Worker] RunID={run_id}: Exporting report version {version}...")
+    t0 = time.time()
+    try:
+        path = generate_pdf(run_id, version=version, progress=progress)
+    except Exception as e:
+        print(f"[Worker] RunID={run_id}: Export failed: {e}")
+        set_export_status(run_id, version=version, status="error", error=str(e))
+        release_export(run_id, version)  # allow another attempt
+        publish_run_event(run_id, "export_progress", version=version, status="error", error=str(e))
+        return
+    set_export_status(run_id, version=version, status="ready", pdf=path)
+    publish_run_event(run_id, "export_progress", version=version, status="ready", pdf=path)
+    print(f"[Worker] RunID={run_id}: Exported {path} in {time.time() - t0:.2f}s")
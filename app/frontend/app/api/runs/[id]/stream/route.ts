@@ -4,12 +4,18 @@ export const dynamic = "force-dynamic";
 
 const BACKEND = process.env.BACKEND_URL ?? "http://127.0.0.1:8000";
 
-export async function GET(_req: Request, { params }: { params: Promise<{ id: string }> }) {
+export async function GET(req: Request, { params }: { params: Promise<{ id: string }> }) {
   // Next.js 15: params is a Promise
   const { id } = await params;
   const controller = new AbortController();
-  const upstream = await fetch(`${BACKEND}/api/runs/${id}/stream`, {
+  // Pass resume position through so the backend replays only missed events
+  const search = new URL(req.url).search;
+  const headers: Record<string, string> = {};
+  const lastEventId = req.headers.get("last-event-id");
+  if (lastEventId) headers["Last-Event-ID"] = lastEventId;
+  const upstream = await fetch(`${BACKEND}/api/runs/${id}/stream${search}`, {
     method: "GET",
+    headers,
     signal: controller.signal,
   });
 
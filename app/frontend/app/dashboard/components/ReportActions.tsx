@@ -62,7 +62,22 @@ export function ReportActions({ batchRun }: ReportActionsProps) {
   const downloadReport = async () => {
     setIsDownloading(true);
     try {
-                        const response = await fetch(`/api/proxy/api/runs/${batchRun.runId}/export/pdf`, {
+      // Export renders in a background job; reuse the cached PDF when the run is unchanged
+      const base = `/api/proxy/api/runs/${batchRun.runId}/export`;
+      let status = await (await fetch(base, { method: 'POST' })).json();
+      const deadline = Date.now() + 5 * 60 * 1000;
+      while (status.status !== 'ready') {
+        if (status.status === 'error') throw new Error(status.error || 'Export failed');
+        if (Date.now() > deadline) throw new Error('Export timed out');
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        status = await (await fetch(base, { method: 'GET' })).json();
+        // Run changed while exporting: request the new version
+        if (status.status === 'stale' || status.status === 'none') {
+          status = await (await fetch(base, { method: 'POST' })).json();
+        }
+      }
+
+      const response = await fetch(`${base}/pdf`, {
         method: 'GET',
       });
 
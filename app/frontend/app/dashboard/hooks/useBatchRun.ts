@@ -35,6 +35,21 @@ export function useBatchRun({ sessionId }: UseBatchRunProps) {
 
           return { ...prev, questions: updatedQuestions };
 
+        case 'run_progress':
+          // Backend aggregate: the run is done once nothing is pending
+          if (!event.total || event.pending !== 0 || prev.isComplete) return prev;
+          return {
+            ...prev,
+            isRunning: false,
+            isComplete: true,
+            completedAt: new Date(),
+            stats: {
+              answered: event.answered ?? 0,
+              suggested: prev.questions.filter(q => q.decision === 'suggest').length,
+              flagged: event.flagged ?? 0
+            }
+          };
+
         case 'run_complete':
           const stats = {
             answered: prev.questions.filter(q => q.status === 'answered').length,
@@ -31,6 +31,7 @@ export function useSSEStream({ onEvent, onConnectionChange, onError }: UseSSEStr
   const reconnectAttemptsRef = useRef(0);
   const lastOptionsRef = useRef<StartStreamOptions | null>(null);
   const isManuallyStoppedRef = useRef(false);
+  const lastEventIdRef = useRef<string | null>(null);
 
   const log = useCallback((message: string, data?: any) => {
     console.log(`[SSE] ${message}`, data || '');
@@ -109,7 +110,10 @@ export function useSSEStream({ onEvent, onConnectionChange, onError }: UseSSEStr
       ...(options.debug && { debug: 'true' })
     });
     
-    const url = `/api/runs/${options.sessionId}/stream`;
+    // Resume after the last event seen so the backend replays only what was missed
+    const url = lastEventIdRef.current
+      ? `/api/runs/${options.sessionId}/stream?last_event_id=${encodeURIComponent(lastEventIdRef.current)}`
+      : `/api/runs/${options.sessionId}/stream`;
     log(`Connecting to: ${url}`);
 
     const eventSource = new EventSource(url);
@@ -134,6 +138,7 @@ export function useSSEStream({ onEvent, onConnectionChange, onError }: UseSSEStr
       });
       
       resetHeartbeatWatchdog(); // Reset watchdog on any message
+      if (event.lastEventId) lastEventIdRef.current = event.lastEventId;
       
       try {
         const raw = JSON.parse(event.data);
@@ -253,6 +258,9 @@ export function useSSEStream({ onEvent, onConnectionChange, onError }: UseSSEStr
   const startStream = useCallback((options: StartStreamOptions) => {
     isManuallyStoppedRef.current = false;
     reconnectAttemptsRef.current = 0;
+    if (lastOptionsRef.current?.sessionId !== options.sessionId) {
+      lastEventIdRef.current = null; // new run: replay its full log
+    }
     startStreamInternal(options);
   }, [startStreamInternal]);
 
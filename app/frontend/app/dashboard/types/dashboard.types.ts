@@ -24,7 +24,7 @@ export interface BatchRun {
 }
 
 export interface SSEEvent {
-  type: 'question_update' | 'run_complete' | 'error';
+  type: 'question_update' | 'run_progress' | 'run_complete' | 'error';
   question_id?: string;
   status?: QuestionStatus['status'];
   confidence?: number;
@@ -32,6 +32,11 @@ export interface SSEEvent {
   decision?: string;
   verification_conf?: number;
   error?: string;
+  // run_progress aggregate
+  answered?: number;
+  flagged?: number;
+  pending?: number;
+  total?: number;
 }
 
 export interface ExportOptions {